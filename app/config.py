@@ -1,4 +1,5 @@
 import os
+from pydantic import field_validator
 from pydantic_settings import BaseSettings
 from dotenv import load_dotenv
 from urllib.parse import quote_plus
@@ -6,6 +7,9 @@ from urllib.parse import quote_plus
 # Load environment variables from .env file
 load_dotenv()
 
+# Accepted values of RSSI_STORAGE
+RSSI_STORAGE_LAYOUTS = ("rows", "packed")
+
 
 class Settings(BaseSettings):
     # Database configuration
@@ -15,6 +19,107 @@ class Settings(BaseSettings):
     POSTGRES_PORT: str = os.getenv("POSTGRES_PORT", "5432")
     POSTGRES_DB: str = os.getenv("POSTGRES_DB", "fastapi")
 
+    # Engine and connection pool configuration
+    DB_ECHO: bool = os.getenv("DB_ECHO", "false").lower() == "true"
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "3600"))
+    DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+    # asyncpg prepared statements cached per connection (0 disables the cache)
+    DB_STATEMENT_CACHE_SIZE: int = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "500"))
+
+    # Ingestion configuration
+    COLLECT_BULK_INSERT: bool = os.getenv("COLLECT_BULK_INSERT", "true").lower() == "true"
+    # Maintain fingerprint_stats (per-location BSSID summaries) on ingest
+    FINGERPRINT_STATS: bool = os.getenv("FINGERPRINT_STATS", "true").lower() == "true"
+    # Layout of new readings: "rows" (one rssi_values row per reading) or "packed"
+    # (per-sample arrays of BSSID dictionary IDs and RSSI); reads handle both
+    RSSI_STORAGE: str = os.getenv("RSSI_STORAGE", "rows")
+    # Resolved (username, place, location) IDs; a TTL of 0 disables the cache
+    HIERARCHY_CACHE_SIZE: int = int(os.getenv("HIERARCHY_CACHE_SIZE", "10000"))
+    HIERARCHY_CACHE_TTL: float = float(os.getenv("HIERARCHY_CACHE_TTL", "300"))
+    # Write-behind ingestion: /collect answers 202 and background writers insert
+    INGEST_ASYNC: bool = os.getenv("INGEST_ASYNC", "false").lower() == "true"
+    INGEST_QUEUE_SIZE: int = int(os.getenv("INGEST_QUEUE_SIZE", "1000"))
+    INGEST_BATCH_SIZE: int = int(os.getenv("INGEST_BATCH_SIZE", "50"))
+    INGEST_WORKERS: int = int(os.getenv("INGEST_WORKERS", "2"))
+    INGEST_JOURNAL_DIR: str = os.getenv("INGEST_JOURNAL_DIR", "")
+    INGEST_SHUTDOWN_TIMEOUT: float = float(os.getenv("INGEST_SHUTDOWN_TIMEOUT", "10"))
+
+    # Export configuration
+    EXPORT_CHUNK_ROWS: int = int(os.getenv("EXPORT_CHUNK_ROWS", "1000"))
+    # Readings per chunk (and Parquet row group) of the long export formats
+    EXPORT_LONG_CHUNK_ROWS: int = int(os.getenv("EXPORT_LONG_CHUNK_ROWS", "50000"))
+
+    # Retention and partition upkeep of samples (see scripts/partition_samples.py)
+    # Samples older than this are deleted with their readings; 0 keeps everything
+    SAMPLE_RETENTION_DAYS: int = int(os.getenv("SAMPLE_RETENTION_DAYS", "0"))
+    # Months per partition once samples is partitioned by timestamp
+    SAMPLE_PARTITION_MONTHS: int = int(os.getenv("SAMPLE_PARTITION_MONTHS", "1"))
+    # Partitions kept created ahead of the current one; samples timestamped past
+    # them are rejected
+    SAMPLE_PARTITIONS_AHEAD: int = int(os.getenv("SAMPLE_PARTITIONS_AHEAD", "3"))
+    # Seconds between maintenance runs (0 disables them)
+    SAMPLE_MAINTENANCE_INTERVAL: float = float(
+        os.getenv("SAMPLE_MAINTENANCE_INTERVAL", "3600")
+    )
+
+    # Worker pools for CPU-bound and blocking file work ("thread" or "process")
+    EXECUTOR_KIND: str = os.getenv("EXECUTOR_KIND", "thread")
+    EXECUTOR_MAX_WORKERS: int = int(
+        os.getenv("EXECUTOR_MAX_WORKERS", str(os.cpu_count() or 4))
+    )
+    IO_EXECUTOR_MAX_WORKERS: int = int(os.getenv("IO_EXECUTOR_MAX_WORKERS", "8"))
+
+    # Training jobs run in their own process pool
+    TRAINING_MAX_WORKERS: int = int(os.getenv("TRAINING_MAX_WORKERS", "1"))
+
+    # Prediction configuration
+    MODEL_CACHE_SIZE: int = int(os.getenv("MODEL_CACHE_SIZE", "32"))
+    MODEL_CACHE_CHECK_INTERVAL: float = float(
+        os.getenv("MODEL_CACHE_CHECK_INTERVAL", "1.0")
+    )
+    # Scans arriving within the window are scored together in one model call
+    PREDICT_BATCH_WINDOW_MS: float = float(os.getenv("PREDICT_BATCH_WINDOW_MS", "5"))
+    PREDICT_BATCH_MAX_SIZE: int = int(os.getenv("PREDICT_BATCH_MAX_SIZE", "64"))
+    # Prediction engine: forest (whereami's random forest), knn or centroid
+    PREDICTOR_ENGINE: str = os.getenv("PREDICTOR_ENGINE", "forest")
+    # Per-place engines, e.g. "3:knn,7:centroid"
+    PREDICTOR_ENGINE_OVERRIDES: str = os.getenv("PREDICTOR_ENGINE_OVERRIDES", "")
+    KNN_NEIGHBORS: int = int(os.getenv("KNN_NEIGHBORS", "5"))
+    # Locations returned per scan by the compact WebSocket protocol
+    PREDICT_TOP_K: int = int(os.getenv("PREDICT_TOP_K", "3"))
+    # Largest "k" a client may ask for per scan
+    PREDICT_MAX_TOP_K: int = int(os.getenv("PREDICT_MAX_TOP_K", "20"))
+    # Rows scored per model call by POST /predict/{place_id}/batch
+    BATCH_PREDICT_CHUNK_ROWS: int = int(os.getenv("BATCH_PREDICT_CHUNK_ROWS", "1000"))
+    # Place names and model state used to validate WebSocket connects
+    PLACE_CATALOG_SIZE: int = int(os.getenv("PLACE_CATALOG_SIZE", "10000"))
+    # Seconds between refreshes of the cached places (0 disables the background refresh)
+    PLACE_CATALOG_REFRESH_INTERVAL: float = float(
+        os.getenv("PLACE_CATALOG_REFRESH_INTERVAL", "30")
+    )
+    # Smoothing of WebSocket predictions across a connection's scans: none, ema or hmm
+    PREDICT_SMOOTHING: str = os.getenv("PREDICT_SMOOTHING", "none")
+    PREDICT_EMA_ALPHA: float = float(os.getenv("PREDICT_EMA_ALPHA", "0.5"))
+    # Probability of staying at the same location between two scans (hmm)
+    PREDICT_HMM_STAY: float = float(os.getenv("PREDICT_HMM_STAY", "0.9"))
+    # Scans averaged per BSSID before scoring (1 scores each scan as sent)
+    PREDICT_RSSI_WINDOW: int = int(os.getenv("PREDICT_RSSI_WINDOW", "1"))
+    # Mean RSSI change (dB) below which a scan reuses the last result; 0 disables
+    PREDICT_GATE_DB: float = float(os.getenv("PREDICT_GATE_DB", "0"))
+
+    @field_validator("RSSI_STORAGE")
+    @classmethod
+    def _check_rssi_storage(cls, value: str) -> str:
+        layout = value.strip().lower()
+        if layout not in RSSI_STORAGE_LAYOUTS:
+            raise ValueError(
+                f"Unknown RSSI_STORAGE {value!r}, expected one of {RSSI_STORAGE_LAYOUTS}"
+            )
+        return layout
+
     @property
     def DATABASE_URL(self) -> str:
         """Generate database URL with proper escaping for special characters."""
@@ -1,16 +1,49 @@
+import time
+from sqlalchemy import exc
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from app.config import settings
 
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Async queue pool that records how long callers wait to check out a connection."""
+
+    checkouts = 0
+    checkout_timeouts = 0
+    checkout_wait_total = 0.0
+    checkout_wait_max = 0.0
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            InstrumentedQueuePool.checkout_timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            InstrumentedQueuePool.checkouts += 1
+            InstrumentedQueuePool.checkout_wait_total += waited
+            if waited > InstrumentedQueuePool.checkout_wait_max:
+                InstrumentedQueuePool.checkout_wait_max = waited
+
+
 # Create async database engine with proper configuration
 engine = create_async_engine(
     settings.DATABASE_URL,
-    echo=True,
-    # Add proper pool settings for async
-    pool_pre_ping=True,
-    pool_recycle=3600,
-    connect_args={"server_settings": {"timezone": "UTC"}},
+    echo=settings.DB_ECHO,
+    poolclass=InstrumentedQueuePool,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    pool_pre_ping=settings.DB_POOL_PRE_PING,
+    connect_args={
+        "server_settings": {"timezone": "UTC"},
+        "prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+    },
 )
 
 # Create async session factory with proper configuration
@@ -18,10 +51,35 @@ AsyncSessionLocal = async_sessionmaker(
     engine, expire_on_commit=False, class_=AsyncSession, autoflush=False
 )
 
+# Sessions whose statements all read the same snapshot (REPEATABLE READ), for
+# reads spread over several queries that must agree, like exports and training
+SnapshotSessionLocal = async_sessionmaker(
+    engine.execution_options(isolation_level="REPEATABLE READ"),
+    expire_on_commit=False,
+    class_=AsyncSession,
+    autoflush=False,
+)
+
 # Base class for declarative models
 Base = declarative_base()
 
 
+def pool_stats() -> dict:
+    """Current connection pool usage and cumulative checkout wait metrics."""
+    pool = engine.pool
+    return {
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "checkouts_total": InstrumentedQueuePool.checkouts,
+        "checkout_timeouts_total": InstrumentedQueuePool.checkout_timeouts,
+        "checkout_wait_seconds_total": InstrumentedQueuePool.checkout_wait_total,
+        "checkout_wait_seconds_max": InstrumentedQueuePool.checkout_wait_max,
+    }
+
+
 # Dependency to get async DB session
 async def get_db():
     session = AsyncSessionLocal()
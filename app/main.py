@@ -1,15 +1,39 @@
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
-from app.database import engine, Base
-from app.routes import collect, output, predict
+from fastapi import FastAPI, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from app.config import settings
+from app.database import engine, pool_stats
+from app.migrations import run_migrations
+from app.routes import collect, output, predict, stats, train
+from app.services.batcher import batch_scheduler
+from app.services.executor import shutdown_executors
+from app.services.export_cache import export_cache
+from app.services.hierarchy_cache import hierarchy_cache
+from app.services.ingest_queue import ingest_queue
+from app.services.metrics import MetricsMiddleware, stats_collector
+from app.services.place_catalog import place_catalog
+from app.services.sample_partitions import sample_maintenance
+from app.services.training import training_service
 from fastapi.middleware.cors import CORSMiddleware
 
 
 @asynccontextmanager
 async def lifespan(app_: FastAPI):
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+        await run_migrations(conn)
+    if settings.INGEST_ASYNC:
+        await ingest_queue.start()
+    await place_catalog.start()
+    await sample_maintenance.start()
     yield
+    await sample_maintenance.stop()
+    await place_catalog.stop()
+    if settings.INGEST_ASYNC:
+        await ingest_queue.stop(settings.INGEST_SHUTDOWN_TIMEOUT)
+    await training_service.close()
+    await export_cache.close()
+    await batch_scheduler.close()
+    shutdown_executors()
 
 
 app = FastAPI(title="DishaSarthi Companion API", lifespan=lifespan)
@@ -21,14 +45,77 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
+)
+app.add_middleware(MetricsMiddleware)
+
+# Counters the services already keep, read when /metrics is scraped
+stats_collector.add(
+    "db_pool",
+    pool_stats,
+    counters={"checkouts_total", "checkout_timeouts_total", "checkout_wait_seconds_total"},
+)
+stats_collector.add("hierarchy_cache", hierarchy_cache.stats, counters={"hits", "misses"})
+stats_collector.add(
+    "ingest",
+    ingest_queue.stats,
+    counters={"accepted", "rejected", "written_uploads", "written_samples", "failed_uploads", "batches"},
+)
+stats_collector.add("place_catalog", place_catalog.stats, counters={"hits", "misses", "refreshes"})
+stats_collector.add(
+    "sample_maintenance",
+    sample_maintenance.stats,
+    counters={"runs", "created_partitions", "dropped_partitions", "deleted_samples"},
 )
 
 # Include routers
 app.include_router(collect.router)  # Add collect router
 app.include_router(output.router)
 app.include_router(predict.router)
+app.include_router(train.router)
+app.include_router(stats.router)
 
 
 @app.get("/health")
 async def health_check():
     return {"status": "ok", "service": "WiFi Fingerprinting API"}
+
+
+@app.get("/health/pool")
+async def pool_health():
+    """Connection pool usage, for sizing DB_POOL_SIZE against the worker count."""
+    return pool_stats()
+
+
+@app.get("/health/cache")
+async def cache_health():
+    """Hit/miss counters of the (username, place, location) ID cache."""
+    return hierarchy_cache.stats()
+
+
+@app.get("/health/ingest")
+async def ingest_health():
+    """Depth and throughput counters of the write-behind ingestion queue."""
+    return ingest_queue.stats()
+
+
+@app.get("/health/catalog")
+async def catalog_health():
+    """Hit/miss counters of the place catalog used to validate WebSocket connects."""
+    return place_catalog.stats()
+
+
+@app.get("/health/maintenance")
+async def maintenance_health():
+    """Partitions created and dropped and samples deleted by the retention job of this worker."""
+    return sample_maintenance.stats()
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """
+    Prometheus metrics of this worker process: per-stage latencies of /collect,
+    /output and /predict, request durations, WebSocket connections, per-place
+    prediction counters and the pool, cache and queue stats above.
+    """
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
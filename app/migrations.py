@@ -0,0 +1,167 @@
+import logging
+from dataclasses import dataclass
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+from app.database import Base
+
+# Arbitrary key for the advisory lock that serializes migrations across workers
+MIGRATION_LOCK_KEY = 7270155
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    description: str
+    statements: tuple[str, ...]
+
+
+# Applied in order on startup, after Base.metadata.create_all. create_all only adds
+# missing tables, so every change to an existing table needs an entry here. Each
+# statement must be safe to run against a database freshly created by create_all.
+MIGRATIONS = [
+    Migration(
+        version=1,
+        description="Merge duplicate places/locations and add lookup indexes",
+        statements=(
+            # Duplicate (user_id, name) places: move their locations to the oldest one
+            """
+            UPDATE locations SET place_id = d.keep_id
+            FROM (
+                SELECT id, min(id) OVER (PARTITION BY user_id, name) AS keep_id
+                FROM places
+            ) d
+            WHERE locations.place_id = d.id AND d.id <> d.keep_id
+            """,
+            """
+            DELETE FROM places USING (
+                SELECT id, min(id) OVER (PARTITION BY user_id, name) AS keep_id
+                FROM places
+            ) d
+            WHERE places.id = d.id AND d.id <> d.keep_id
+            """,
+            # Duplicate (place_id, name) locations: move their samples to the oldest one
+            """
+            UPDATE samples SET location_id = d.keep_id
+            FROM (
+                SELECT id, min(id) OVER (PARTITION BY place_id, name) AS keep_id
+                FROM locations
+            ) d
+            WHERE samples.location_id = d.id AND d.id <> d.keep_id
+            """,
+            """
+            DELETE FROM locations USING (
+                SELECT id, min(id) OVER (PARTITION BY place_id, name) AS keep_id
+                FROM locations
+            ) d
+            WHERE locations.id = d.id AND d.id <> d.keep_id
+            """,
+            "CREATE UNIQUE INDEX IF NOT EXISTS uq_places_user_id_name ON places (user_id, name)",
+            "CREATE UNIQUE INDEX IF NOT EXISTS uq_locations_place_id_name ON locations (place_id, name)",
+            "CREATE INDEX IF NOT EXISTS ix_samples_location_id_timestamp ON samples (location_id, timestamp)",
+        ),
+    ),
+    Migration(
+        version=2,
+        description="Backfill fingerprint_stats from existing samples",
+        statements=(
+            """
+            INSERT INTO fingerprint_stats (
+                location_id, bssid, sample_count, mean_rssi, m2, min_rssi, max_rssi, last_seen
+            )
+            SELECT
+                s.location_id,
+                r.bssid,
+                count(*),
+                avg(r.rssi),
+                coalesce(var_pop(r.rssi) * count(*), 0),
+                min(r.rssi),
+                max(r.rssi),
+                max(s.timestamp)
+            FROM rssi_values r
+            JOIN samples s ON s.id = r.sample_id
+            WHERE s.location_id IS NOT NULL AND r.rssi IS NOT NULL
+            GROUP BY s.location_id, r.bssid
+            ON CONFLICT DO NOTHING
+            """,
+        ),
+    ),
+    Migration(
+        version=3,
+        description="Add the packed RSSI layout: bssids dictionary and per-sample arrays",
+        statements=(
+            # The bssids table itself is created by create_all
+            "ALTER TABLE samples ADD COLUMN IF NOT EXISTS bssid_ids integer[]",
+            "ALTER TABLE samples ADD COLUMN IF NOT EXISTS rssis smallint[]",
+        ),
+    ),
+    Migration(
+        version=4,
+        description="Add per-place data versions",
+        statements=(
+            "ALTER TABLE places ADD COLUMN IF NOT EXISTS data_version integer NOT NULL DEFAULT 0",
+            "ALTER TABLE samples ADD COLUMN IF NOT EXISTS data_version integer NOT NULL DEFAULT 0",
+            "ALTER TABLE training_jobs ADD COLUMN IF NOT EXISTS data_version integer",
+            # Existing samples stay at version 0, below their place's version
+            """
+            UPDATE places SET data_version = 1
+            WHERE data_version = 0 AND EXISTS (
+                SELECT 1 FROM samples s JOIN locations l ON l.id = s.location_id
+                WHERE l.place_id = places.id
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS ix_samples_location_id_data_version ON samples (location_id, data_version)",
+        ),
+    ),
+    Migration(
+        version=5,
+        description="Record the time window of training jobs",
+        statements=(
+            "ALTER TABLE training_jobs ADD COLUMN IF NOT EXISTS since timestamp with time zone",
+            "ALTER TABLE training_jobs ADD COLUMN IF NOT EXISTS until timestamp with time zone",
+        ),
+    ),
+    Migration(
+        version=6,
+        description="Drop the unused training_jobs.sample_high_water column",
+        statements=(
+            # Only ever created by create_all, superseded by data_version
+            "ALTER TABLE training_jobs DROP COLUMN IF EXISTS sample_high_water",
+        ),
+    ),
+]
+
+
+async def run_migrations(conn: AsyncConnection) -> None:
+    """Create missing tables and apply pending migrations inside the caller's transaction."""
+    # Workers starting at the same time wait here instead of racing each other
+    await conn.execute(
+        text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_KEY}
+    )
+    await conn.run_sync(Base.metadata.create_all)
+    await conn.execute(
+        text(
+            """
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                description VARCHAR NOT NULL,
+                applied_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+            )
+            """
+        )
+    )
+
+    result = await conn.execute(text("SELECT version FROM schema_migrations"))
+    applied = set(result.scalars().all())
+
+    for migration in MIGRATIONS:
+        if migration.version in applied:
+            continue
+        logging.info(f"Applying migration {migration.version}: {migration.description}")
+        for statement in migration.statements:
+            await conn.execute(text(statement))
+        await conn.execute(
+            text(
+                "INSERT INTO schema_migrations (version, description) VALUES (:version, :description)"
+            ),
+            {"version": migration.version, "description": migration.description},
+        )
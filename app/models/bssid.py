@@ -0,0 +1,11 @@
+from sqlalchemy import Column, Integer, String
+from app.database import Base
+
+
+class Bssid(Base):
+    """Dictionary of every BSSID seen, referenced by ID from the packed sample arrays."""
+
+    __tablename__ = "bssids"
+
+    id = Column(Integer, primary_key=True)
+    bssid = Column(String, nullable=False, unique=True)
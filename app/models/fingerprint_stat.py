@@ -0,0 +1,21 @@
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey
+from sqlalchemy.orm import relationship
+from app.database import Base
+
+
+class FingerprintStat(Base):
+    """Running RSSI statistics per (location, BSSID), maintained on ingest."""
+
+    __tablename__ = "fingerprint_stats"
+
+    location_id = Column(Integer, ForeignKey("locations.id"), primary_key=True)
+    bssid = Column(String, primary_key=True)
+    sample_count = Column(Integer, nullable=False)
+    mean_rssi = Column(Float, nullable=False)
+    # Sum of squared deviations from the mean (Welford), variance = m2 / sample_count
+    m2 = Column(Float, nullable=False)
+    min_rssi = Column(Integer, nullable=False)
+    max_rssi = Column(Integer, nullable=False)
+    last_seen = Column(DateTime(timezone=True))
+
+    location = relationship("Location")
@@ -1,14 +1,21 @@
-from sqlalchemy import Column, Integer, String, ForeignKey
+from sqlalchemy import Column, Integer, String, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from app.database import Base
 
 
 class Place(Base):
     __tablename__ = "places"
+    __table_args__ = (
+        Index("uq_places_user_id_name", "user_id", "name", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String)
     user_id = Column(Integer, ForeignKey("users.id"))
+    # Bumped by every transaction that adds, changes or deletes samples of the
+    # place; the place row stays locked until it commits, so versions follow
+    # commit order
+    data_version = Column(Integer, nullable=False, server_default="0")
 
     user = relationship("User", back_populates="places")
     locations = relationship("Location", back_populates="place")
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, SmallInteger, DateTime, ForeignKey, Index
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -6,10 +7,20 @@ from app.database import Base
 
 class Sample(Base):
     __tablename__ = "samples"
+    __table_args__ = (
+        Index("ix_samples_location_id_timestamp", "location_id", "timestamp"),
+        Index("ix_samples_location_id_data_version", "location_id", "data_version"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     timestamp = Column(DateTime(timezone=True), default=func.now())  # Change here
     location_id = Column(Integer, ForeignKey("locations.id"))
+    # Packed layout (RSSI_STORAGE=packed): the readings as parallel arrays of
+    # bssids.id and RSSI instead of rssi_values rows
+    bssid_ids = Column(ARRAY(Integer))
+    rssis = Column(ARRAY(SmallInteger))
+    # Place data version (Place.data_version) of the last write to this sample
+    data_version = Column(Integer, nullable=False, server_default="0")
 
     location = relationship("Location", back_populates="samples")
     rssi_values = relationship("RSSIValue", back_populates="sample")
@@ -0,0 +1,26 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
+from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
+from app.database import Base
+
+
+class TrainingJob(Base):
+    __tablename__ = "training_jobs"
+    __table_args__ = (Index("ix_training_jobs_place_id_id", "place_id", "id"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    place_id = Column(Integer, ForeignKey("places.id"))
+    # queued -> running -> succeeded | failed
+    status = Column(String, default="queued")
+    created_at = Column(DateTime(timezone=True), default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    # Place data version the training data was read at
+    data_version = Column(Integer, nullable=True)
+    # Time window of the training samples, if the job was limited to one
+    since = Column(DateTime(timezone=True), nullable=True)
+    until = Column(DateTime(timezone=True), nullable=True)
+    samples_used = Column(Integer, nullable=True)
+    error = Column(String, nullable=True)
+
+    place = relationship("Place")
@@ -0,0 +1,48 @@
+from typing import Iterable
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from app.models.bssid import Bssid
+
+
+class BssidRepository:
+    def __init__(self, session):
+        self.session = session
+
+    async def get_ids(self, bssids: Iterable[str]) -> dict[str, int]:
+        """Map the BSSIDs that are already in the dictionary to their IDs."""
+        bssids = list(bssids)
+        if not bssids:
+            return {}
+        result = await self.session.execute(
+            select(Bssid.bssid, Bssid.id).where(Bssid.bssid.in_(bssids))
+        )
+        return dict(result.all())
+
+    async def resolve(self, bssids: Iterable[str]) -> dict[str, int]:
+        """
+        Map BSSIDs to their dictionary IDs, adding the missing ones inside the
+        caller's transaction. Inserted in sorted order, so concurrent uploads of
+        overlapping BSSIDs cannot deadlock.
+        """
+        bssids = sorted(set(bssids))
+        ids = await self.get_ids(bssids)
+        missing = [bssid for bssid in bssids if bssid not in ids]
+        if missing:
+            await self.session.execute(
+                insert(Bssid).on_conflict_do_nothing(index_elements=[Bssid.bssid]),
+                [{"bssid": bssid} for bssid in missing],
+            )
+            # A separate statement, so rows a concurrent upload committed while we
+            # waited on the conflict are visible too
+            ids.update(await self.get_ids(missing))
+        return ids
+
+    async def get_bssids(self, ids: Iterable[int]) -> dict[int, str]:
+        """Map dictionary IDs back to BSSIDs."""
+        ids = list(ids)
+        if not ids:
+            return {}
+        result = await self.session.execute(
+            select(Bssid.id, Bssid.bssid).where(Bssid.id.in_(ids))
+        )
+        return dict(result.all())
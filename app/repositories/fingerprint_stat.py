@@ -0,0 +1,110 @@
+from typing import Optional
+from sqlalchemy import select, func
+from sqlalchemy.dialects.postgresql import insert
+from app.models.fingerprint_stat import FingerprintStat
+from app.models.location import Location
+from app.schemas.collect import RSSISample
+
+
+def aggregate_samples(samples: list[tuple[int, RSSISample]]) -> list[dict]:
+    """
+    Fold (location_id, sample) pairs into one statistics row per (location_id, bssid)
+    with Welford's algorithm, sorted by key.
+    """
+    stats: dict[tuple[int, str], list] = {}
+    for location_id, sample in samples:
+        for bssid, rssi in sample.rssi_values.items():
+            entry = stats.get((location_id, bssid))
+            if entry is None:
+                stats[(location_id, bssid)] = [1, float(rssi), 0.0, rssi, rssi, sample.timestamp]
+                continue
+            entry[0] += 1
+            delta = rssi - entry[1]
+            entry[1] += delta / entry[0]
+            entry[2] += delta * (rssi - entry[1])
+            entry[3] = min(entry[3], rssi)
+            entry[4] = max(entry[4], rssi)
+            if sample.timestamp is not None and (entry[5] is None or sample.timestamp > entry[5]):
+                entry[5] = sample.timestamp
+
+    return [
+        {
+            "location_id": location_id,
+            "bssid": bssid,
+            "sample_count": count,
+            "mean_rssi": mean,
+            "m2": m2,
+            "min_rssi": min_rssi,
+            "max_rssi": max_rssi,
+            "last_seen": last_seen,
+        }
+        for (location_id, bssid), (count, mean, m2, min_rssi, max_rssi, last_seen) in sorted(
+            stats.items()
+        )
+    ]
+
+
+class FingerprintStatRepository:
+    def __init__(self, session):
+        self.session = session
+
+    async def record_samples(self, samples: list[tuple[int, RSSISample]]) -> None:
+        """
+        Merge new (location_id, sample) pairs into the running statistics inside the
+        caller's transaction. Each batch is pre-aggregated and combined with the
+        stored row using the parallel variance formula, so a row is touched once
+        per batch. Rows are written in key order, so concurrent batches lock them
+        in the same order and cannot deadlock.
+        """
+        rows = aggregate_samples(samples)
+        if not rows:
+            return
+
+        statement = insert(FingerprintStat)
+        stored = FingerprintStat.__table__.c
+        new = statement.excluded
+        total = stored.sample_count + new.sample_count
+        delta = new.mean_rssi - stored.mean_rssi
+        statement = statement.on_conflict_do_update(
+            index_elements=[FingerprintStat.location_id, FingerprintStat.bssid],
+            set_={
+                "sample_count": total,
+                "mean_rssi": stored.mean_rssi + delta * new.sample_count / total,
+                "m2": stored.m2
+                + new.m2
+                + delta * delta * stored.sample_count * new.sample_count / total,
+                "min_rssi": func.least(stored.min_rssi, new.min_rssi),
+                "max_rssi": func.greatest(stored.max_rssi, new.max_rssi),
+                "last_seen": func.greatest(stored.last_seen, new.last_seen),
+            },
+        )
+        await self.session.execute(statement, rows)
+
+    async def get_place_stats(
+        self, place_id: int, location_id: Optional[int] = None, min_count: int = 1
+    ):
+        """
+        Statistics of every (location, BSSID) pair of a place, ordered by location
+        and BSSID. Rows carry the location name and the population standard deviation.
+        """
+        query = (
+            select(
+                FingerprintStat.location_id,
+                Location.name.label("location"),
+                FingerprintStat.bssid,
+                FingerprintStat.sample_count,
+                FingerprintStat.mean_rssi,
+                func.sqrt(FingerprintStat.m2 / FingerprintStat.sample_count).label("std_rssi"),
+                FingerprintStat.min_rssi,
+                FingerprintStat.max_rssi,
+                FingerprintStat.last_seen,
+            )
+            .join(Location, Location.id == FingerprintStat.location_id)
+            .where(Location.place_id == place_id, FingerprintStat.sample_count >= min_count)
+        )
+        if location_id is not None:
+            query = query.where(FingerprintStat.location_id == location_id)
+        result = await self.session.execute(
+            query.order_by(FingerprintStat.location_id, FingerprintStat.bssid)
+        )
+        return result.all()
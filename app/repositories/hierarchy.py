@@ -0,0 +1,87 @@
+from sqlalchemy import select, literal, true, union_all
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.user import User
+from app.models.place import Place
+from app.models.location import Location
+
+# A concurrent writer that commits the same row while our statement runs makes
+# ON CONFLICT skip the insert while the row is not yet visible to our snapshot.
+# Re-running the statement takes a new snapshot that sees it.
+MAX_RESOLVE_ATTEMPTS = 3
+
+
+class HierarchyRepository:
+    """Resolves the user -> place -> location path used by data collection."""
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    @staticmethod
+    def _resolve_statement(username: str, place_name: str, location_name: str):
+        inserted_user = (
+            insert(User)
+            .values(username=username)
+            .on_conflict_do_nothing(index_elements=[User.username])
+            .returning(User.id)
+            .cte("inserted_user")
+        )
+        user = union_all(
+            select(inserted_user.c.id),
+            select(User.id).where(User.username == username),
+        ).limit(1).cte("resolved_user")
+
+        inserted_place = (
+            insert(Place)
+            .from_select([Place.name, Place.user_id], select(literal(place_name), user.c.id))
+            .on_conflict_do_nothing(index_elements=[Place.user_id, Place.name])
+            .returning(Place.id)
+            .cte("inserted_place")
+        )
+        place = union_all(
+            select(inserted_place.c.id),
+            select(Place.id)
+            .join(user, Place.user_id == user.c.id)
+            .where(Place.name == place_name),
+        ).limit(1).cte("resolved_place")
+
+        inserted_location = (
+            insert(Location)
+            .from_select(
+                [Location.name, Location.place_id], select(literal(location_name), place.c.id)
+            )
+            .on_conflict_do_nothing(index_elements=[Location.place_id, Location.name])
+            .returning(Location.id)
+            .cte("inserted_location")
+        )
+        location = union_all(
+            select(inserted_location.c.id),
+            select(Location.id)
+            .join(place, Location.place_id == place.c.id)
+            .where(Location.name == location_name),
+        ).limit(1).cte("resolved_location")
+
+        # Each resolved_* CTE yields a single row
+        return select(
+            user.c.id.label("user_id"),
+            place.c.id.label("place_id"),
+            location.c.id.label("location_id"),
+        ).select_from(user.join(place, true()).join(location, true()))
+
+    async def resolve(
+        self, username: str, place_name: str, location_name: str
+    ) -> tuple[int, int, int]:
+        """
+        Get or create the user, place and location in a single INSERT ... ON CONFLICT
+        DO NOTHING statement and return (user_id, place_id, location_id). Safe to run
+        concurrently for the same path thanks to the unique indexes on each level.
+        """
+        statement = self._resolve_statement(username, place_name, location_name)
+        for _ in range(MAX_RESOLVE_ATTEMPTS):
+            result = await self.session.execute(statement)
+            row = result.one_or_none()
+            if row is not None:
+                return row.user_id, row.place_id, row.location_id
+        raise RuntimeError(
+            f"Could not resolve {username!r}/{place_name!r}/{location_name!r}"
+        )
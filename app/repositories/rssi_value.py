@@ -1,8 +1,18 @@
-from sqlalchemy import select, update, delete
+from datetime import datetime
+from typing import AsyncIterator, Optional
+from sqlalchemy import select, update, delete, func, union
 from fastapi import HTTPException, status
+from app.models.bssid import Bssid
+from app.models.location import Location
 from app.models.rssi_value import RSSIValue
+from app.models.sample import Sample
+from app.repositories.bssid import BssidRepository
+from app.repositories.sample import SampleRepository
 from app.schemas.rssi_value import RSSIValueCreate, RSSIValueUpdate
 
+# Assumed readings per packed sample when sizing fetches for a number of readings
+READINGS_PER_SAMPLE = 32
+
 
 class RSSIValueRepository:
     def __init__(self, session):
@@ -13,6 +23,7 @@ class RSSIValueRepository:
     ) -> RSSIValue:
         new_rssi = RSSIValue(sample_id=sample_id, **rssi_data.model_dump())
         self.session.add(new_rssi)
+        await SampleRepository(self.session).mark_changed(sample_id)
         await self.session.commit()
         await self.session.refresh(new_rssi)
         return new_rssi
@@ -50,6 +61,7 @@ class RSSIValueRepository:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, detail="RSSI value not found"
             )
+        await SampleRepository(self.session).mark_changed(sample_id)
         await self.session.commit()
         return updated
 
@@ -63,4 +75,213 @@ class RSSIValueRepository:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, detail="RSSI value not found"
             )
+        await SampleRepository(self.session).mark_changed(sample_id)
         await self.session.commit()
+
+    @staticmethod
+    def _filter_samples(
+        query,
+        max_version: Optional[int] = None,
+        after_version: Optional[int] = None,
+        after_sample_id: Optional[int] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ):
+        """
+        Restrict a query joined with Sample to a range of data versions, samples
+        after a sample ID and/or within a time window.
+        """
+        if max_version is not None:
+            query = query.where(Sample.data_version <= max_version)
+        if after_version is not None:
+            query = query.where(Sample.data_version > after_version)
+        if after_sample_id is not None:
+            query = query.where(Sample.id > after_sample_id)
+        if since is not None:
+            query = query.where(Sample.timestamp >= since)
+        if until is not None:
+            query = query.where(Sample.timestamp < until)
+        return query
+
+    def _packed_bssid_ids(self, place_id: int, *filters):
+        """Subquery of the dictionary IDs used by the packed samples of a place."""
+        query = (
+            select(func.unnest(Sample.bssid_ids))
+            .join(Location, Location.id == Sample.location_id)
+            .where(Location.place_id == place_id, Sample.bssid_ids.is_not(None))
+        )
+        return self._filter_samples(query, *filters)
+
+    async def get_place_bssids(
+        self,
+        place_id: int,
+        max_version: Optional[int] = None,
+        after_version: Optional[int] = None,
+        after_sample_id: Optional[int] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> list[str]:
+        """Return the sorted list of distinct BSSIDs recorded for a place, in either layout."""
+        filters = (max_version, after_version, after_sample_id, since, until)
+        rows_query = (
+            select(RSSIValue.bssid)
+            .join(Sample, Sample.id == RSSIValue.sample_id)
+            .join(Location, Location.id == Sample.location_id)
+            .where(Location.place_id == place_id)
+        )
+        packed_query = select(Bssid.bssid).where(
+            Bssid.id.in_(self._packed_bssid_ids(place_id, *filters))
+        )
+        bssids = union(self._filter_samples(rows_query, *filters), packed_query).subquery()
+        result = await self.session.execute(
+            select(bssids.c.bssid).order_by(bssids.c.bssid)
+        )
+        return list(result.scalars().all())
+
+    async def _bssid_names(self, bssids: Optional[list[str]]) -> dict[int, str]:
+        """Dictionary ID -> BSSID for a list of BSSIDs the caller already has."""
+        if not bssids:
+            return {}
+        ids = await BssidRepository(self.session).get_ids(bssids)
+        return {bssid_id: bssid for bssid, bssid_id in ids.items()}
+
+    async def _stream_packed(
+        self,
+        place_id: int,
+        chunk_size: int,
+        names: dict[int, str],
+        *filters,
+    ) -> AsyncIterator[tuple[str, int, datetime, list[str], list[int]]]:
+        """
+        Stream the packed samples of a place as (location_name, sample_id, timestamp,
+        bssids, rssis), one row per sample, ordered by location and sample. `names`
+        maps dictionary IDs to BSSIDs; IDs it lacks are looked up for each fetched
+        chunk and added to it.
+        """
+        query = (
+            select(Location.name, Sample.id, Sample.timestamp, Sample.bssid_ids, Sample.rssis)
+            .join(Sample, Sample.location_id == Location.id)
+            .where(Location.place_id == place_id, Sample.bssid_ids.is_not(None))
+        )
+        query = self._filter_samples(query, *filters)
+        result = await self.session.stream(
+            query.order_by(Location.id, Sample.id).execution_options(
+                yield_per=chunk_size
+            )
+        )
+        bssid_repo = BssidRepository(self.session)
+        async for partition in result.partitions():
+            missing = {i for row in partition for i in row.bssid_ids if i not in names}
+            if missing:
+                names.update(await bssid_repo.get_bssids(missing))
+            for location_name, sample_id, timestamp, bssid_ids, rssis in partition:
+                yield location_name, sample_id, timestamp, [names[i] for i in bssid_ids], rssis
+
+    async def stream_place_samples(
+        self,
+        place_id: int,
+        chunk_size: int = 1000,
+        max_version: Optional[int] = None,
+        after_version: Optional[int] = None,
+        after_sample_id: Optional[int] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        bssids: Optional[list[str]] = None,
+    ) -> AsyncIterator[tuple[str, int, dict[str, int]]]:
+        """
+        Stream every sample of a place as (location_name, sample_id, {bssid: rssi})
+        using a single joined query read through a server-side cursor. Only samples
+        last written at a data version above after_version and at or below
+        max_version, with an ID above after_sample_id, taken at or after `since`
+        and before `until` are included, for each bound that is given.
+
+        Samples stored as rssi_values rows come first, then packed samples, each
+        ordered by location and sample. Samples without readings are included with
+        an empty dict. Passing the BSSIDs the samples use (get_place_bssids) saves
+        looking up the names of packed readings chunk by chunk.
+        """
+        filters = (max_version, after_version, after_sample_id, since, until)
+
+        # Outer join: a sample without readings still gets its (all missing) row
+        query = (
+            select(Location.name, Sample.id, RSSIValue.bssid, RSSIValue.rssi)
+            .join(Sample, Sample.location_id == Location.id)
+            .outerjoin(RSSIValue, RSSIValue.sample_id == Sample.id)
+            .where(Location.place_id == place_id, Sample.bssid_ids.is_(None))
+        )
+        query = self._filter_samples(query, *filters)
+        result = await self.session.stream(
+            query.order_by(Location.id, Sample.id).execution_options(
+                yield_per=chunk_size
+            )
+        )
+
+        current_id = None
+        current_location = None
+        current_values: dict[str, int] = {}
+        async for location_name, sample_id, bssid, rssi in result:
+            if sample_id != current_id:
+                if current_id is not None:
+                    yield current_location, current_id, current_values
+                current_id = sample_id
+                current_location = location_name
+                current_values = {}
+            if bssid is not None:
+                current_values[bssid] = rssi
+
+        if current_id is not None:
+            yield current_location, current_id, current_values
+
+        names = await self._bssid_names(bssids)
+        async for location_name, sample_id, _, sample_bssids, rssis in self._stream_packed(
+            place_id, chunk_size, names, *filters
+        ):
+            yield location_name, sample_id, dict(zip(sample_bssids, rssis))
+
+    async def stream_place_readings(
+        self,
+        place_id: int,
+        chunk_size: int = 50000,
+        max_version: Optional[int] = None,
+        after_version: Optional[int] = None,
+        after_sample_id: Optional[int] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> AsyncIterator[list[tuple]]:
+        """
+        Stream the raw readings of a place in chunks of up to chunk_size
+        (location_name, sample_id, timestamp, bssid, rssi) rows, ordered like
+        stream_place_samples. Samples are filtered like in stream_place_samples.
+        """
+        filters = (max_version, after_version, after_sample_id, since, until)
+
+        query = (
+            select(
+                Location.name, Sample.id, Sample.timestamp, RSSIValue.bssid, RSSIValue.rssi
+            )
+            .join(Sample, Sample.location_id == Location.id)
+            .join(RSSIValue, RSSIValue.sample_id == Sample.id)
+            .where(Location.place_id == place_id)
+        )
+        query = self._filter_samples(query, *filters)
+        result = await self.session.stream(
+            query.order_by(Location.id, Sample.id).execution_options(
+                yield_per=chunk_size
+            )
+        )
+        async for partition in result.partitions():
+            yield [tuple(row) for row in partition]
+
+        readings = []
+        async for location_name, sample_id, timestamp, bssids, rssis in self._stream_packed(
+            place_id, max(1, chunk_size // READINGS_PER_SAMPLE), {}, *filters
+        ):
+            readings.extend(
+                (location_name, sample_id, timestamp, bssid, rssi)
+                for bssid, rssi in zip(bssids, rssis)
+            )
+            if len(readings) >= chunk_size:
+                yield readings
+                readings = []
+        if readings:
+            yield readings
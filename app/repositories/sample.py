@@ -1,8 +1,12 @@
-from sqlalchemy import select, update, delete
+from sqlalchemy import select, update, delete, insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import HTTPException, status
+from app.models.location import Location
+from app.models.place import Place
 from app.models.sample import Sample
 from app.models.rssi_value import RSSIValue
+from app.repositories.bssid import BssidRepository
+from app.schemas.collect import RSSISample
 from app.schemas.sample import SampleCreate, SampleUpdate
 
 
@@ -10,31 +14,157 @@ class SampleRepository:
     def __init__(self, session: AsyncSession):
         self.session = session
 
-    async def create_sample(self, sample_data: SampleCreate) -> Sample:
+    async def _bump_versions(self, location_ids, sample_ids=()) -> None:
+        """
+        Bump the data version of the places of these locations and stamp the new
+        version on the given samples. The place rows stay locked until the
+        caller's transaction ends, so a later version always commits after an
+        earlier one; they are locked in ID order so concurrent writers cannot
+        deadlock. Call it last before committing, so the lock is held briefly.
+        """
+        location_ids = list(set(location_ids))
+        if not location_ids:
+            return
+        # A statement of its own: an UPDATE that had to wait for a row lock would
+        # re-check the row from its older snapshot and can deadlock other waiters
+        result = await self.session.execute(
+            select(Place.id)
+            .join(Location, Location.place_id == Place.id)
+            .where(Location.id.in_(location_ids))
+            .order_by(Place.id)
+            # NO KEY UPDATE: new locations' foreign key checks on the place don't block it
+            .with_for_update(of=Place, key_share=True)
+        )
+        place_ids = set(result.scalars().all())
+        if not place_ids:
+            return
+        bump = (
+            update(Place)
+            .where(Place.id.in_(place_ids))
+            .values(data_version=Place.data_version + 1)
+        )
+        if not sample_ids:
+            await self.session.execute(bump)
+            return
+        bumped = bump.returning(Place.id, Place.data_version).cte("bumped")
+        await self.session.execute(
+            update(Sample)
+            .add_cte(bumped)
+            .where(
+                Sample.id.in_(list(sample_ids)),
+                Location.id == Sample.location_id,
+                bumped.c.id == Location.place_id,
+            )
+            .values(data_version=bumped.c.data_version)
+            .execution_options(synchronize_session=False)
+        )
+
+    async def mark_changed(self, sample_id: int) -> None:
+        """Give a sample whose readings changed a new data version of its place."""
+        location_id = (
+            await self.session.execute(
+                select(Sample.location_id).where(Sample.id == sample_id)
+            )
+        ).scalar_one_or_none()
+        await self._bump_versions([location_id], [sample_id])
+
+    async def create_sample(self, sample_data: SampleCreate, packed: bool = False) -> Sample:
         # Create Sample with timestamp
         new_sample = Sample(
             location_id=sample_data.location_id,
             timestamp=sample_data.timestamp,
         )
+        if packed:
+            ids = await BssidRepository(self.session).resolve(
+                rssi.bssid for rssi in sample_data.rssi_values
+            )
+            new_sample.bssid_ids = [ids[rssi.bssid] for rssi in sample_data.rssi_values]
+            new_sample.rssis = [rssi.rssi for rssi in sample_data.rssi_values]
         self.session.add(new_sample)
         # Need to await flush to get the ID
         await self.session.flush()
 
-        # Create RSSI values
-        rssi_values = [
-            RSSIValue(sample_id=new_sample.id, bssid=rssi.bssid, rssi=rssi.rssi)
-            for rssi in sample_data.rssi_values
-        ]
-        self.session.add_all(rssi_values)
+        if not packed:
+            # Create RSSI values
+            rssi_values = [
+                RSSIValue(sample_id=new_sample.id, bssid=rssi.bssid, rssi=rssi.rssi)
+                for rssi in sample_data.rssi_values
+            ]
+            self.session.add_all(rssi_values)
+            await self.session.flush()
 
+        await self._bump_versions([sample_data.location_id], [new_sample.id])
         return new_sample
 
+    async def bulk_create_samples(
+        self, samples: list[tuple[int, RSSISample]], packed: bool = False
+    ) -> list[int]:
+        """
+        Insert (location_id, sample) pairs with one multi-row INSERT for the samples
+        and one for their RSSI values, or with the readings packed into the sample
+        rows (see Sample.bssid_ids). Runs inside the caller's transaction and
+        returns the new sample IDs in input order.
+
+        Each affected place gets one new data version, stamped on its new samples
+        last: the place rows are locked from then until the commit, so callers
+        should write anything else (e.g. fingerprint stats) first.
+        """
+        if not samples:
+            return []
+
+        if packed:
+            ids = await BssidRepository(self.session).resolve(
+                bssid for _, sample in samples for bssid in sample.rssi_values
+            )
+            result = await self.session.execute(
+                insert(Sample).returning(Sample.id, sort_by_parameter_order=True),
+                [
+                    {
+                        "location_id": location_id,
+                        "timestamp": sample.timestamp,
+                        "bssid_ids": [ids[bssid] for bssid in sample.rssi_values],
+                        "rssis": list(sample.rssi_values.values()),
+                    }
+                    for location_id, sample in samples
+                ],
+            )
+            sample_ids = list(result.scalars().all())
+            await self._bump_versions((location_id for location_id, _ in samples), sample_ids)
+            return sample_ids
+
+        result = await self.session.execute(
+            insert(Sample).returning(Sample.id, sort_by_parameter_order=True),
+            [
+                {"location_id": location_id, "timestamp": sample.timestamp}
+                for location_id, sample in samples
+            ],
+        )
+        sample_ids = list(result.scalars().all())
+
+        rssi_rows = [
+            {"sample_id": sample_id, "bssid": bssid, "rssi": rssi}
+            for sample_id, (_, sample) in zip(sample_ids, samples)
+            for bssid, rssi in sample.rssi_values.items()
+        ]
+        if rssi_rows:
+            await self.session.execute(insert(RSSIValue), rssi_rows)
+
+        await self._bump_versions((location_id for location_id, _ in samples), sample_ids)
+        return sample_ids
+
     async def get_samples(self, location_id: int) -> list[Sample]:
         result = await self.session.execute(
             select(Sample).where(Sample.location_id == location_id)
         )
         return result.scalars().all()
 
+    async def get_place_version(self, place_id: int) -> int:
+        """Return the data version of a place: 0 until samples are first added."""
+        result = await self.session.execute(
+            select(Place.data_version).where(Place.id == place_id)
+        )
+        return result.scalar_one_or_none() or 0
+
     async def get_sample(self, sample_id: int) -> Sample:
         result = await self.session.execute(
             select(Sample).where(Sample.id == sample_id)
@@ -47,10 +177,16 @@ class SampleRepository:
         return sample
 
     async def update_sample(self, sample_id: int, sample_data: SampleUpdate) -> Sample:
+        values = sample_data.model_dump(exclude_unset=True)
+        old_location_id = (
+            await self.session.execute(
+                select(Sample.location_id).where(Sample.id == sample_id)
+            )
+        ).scalar_one_or_none()
         result = await self.session.execute(
             update(Sample)
             .where(Sample.id == sample_id)
-            .values(**sample_data.model_dump(exclude_unset=True))
+            .values(**values)
             .returning(Sample)
         )
         sample = result.scalar_one_or_none()
@@ -58,13 +194,22 @@ class SampleRepository:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, detail="Sample not found"
             )
+        # Both the place the sample leaves and the one it moves to change
+        await self._bump_versions([old_location_id, sample.location_id], [sample_id])
         return sample
 
     async def delete_sample(self, sample_id: int) -> None:
+        # No foreign key cascades this once samples is partitioned
+        # (scripts/partition_samples.py), so readings are deleted explicitly
+        await self.session.execute(
+            delete(RSSIValue).where(RSSIValue.sample_id == sample_id)
+        )
         result = await self.session.execute(
-            delete(Sample).where(Sample.id == sample_id).returning(Sample.id)
+            delete(Sample).where(Sample.id == sample_id).returning(Sample.location_id)
         )
-        if not result.scalar_one_or_none():
+        deleted = result.one_or_none()
+        if deleted is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, detail="Sample not found"
             )
+        await self._bump_versions([deleted.location_id])
@@ -0,0 +1,82 @@
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import select, update
+from sqlalchemy.sql import func
+from fastapi import HTTPException, status
+from app.models.training_job import TrainingJob
+
+
+class TrainingJobRepository:
+    def __init__(self, session):
+        self.session = session
+
+    async def create_job(
+        self,
+        place_id: int,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> TrainingJob:
+        new_job = TrainingJob(place_id=place_id, status="queued", since=since, until=until)
+        self.session.add(new_job)
+        await self.session.commit()
+        await self.session.refresh(new_job)
+        return new_job
+
+    async def get_job(self, job_id: int) -> TrainingJob:
+        result = await self.session.execute(
+            select(TrainingJob).where(TrainingJob.id == job_id)
+        )
+        job = result.scalar_one_or_none()
+        if not job:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="Training job not found"
+            )
+        return job
+
+    async def get_jobs(self, place_id: int, limit: int = 20) -> list[TrainingJob]:
+        result = await self.session.execute(
+            select(TrainingJob)
+            .where(TrainingJob.place_id == place_id)
+            .order_by(TrainingJob.id.desc())
+            .limit(limit)
+        )
+        return result.scalars().all()
+
+    async def get_latest_succeeded_job(self, place_id: int) -> Optional[TrainingJob]:
+        result = await self.session.execute(
+            select(TrainingJob)
+            .where(TrainingJob.place_id == place_id, TrainingJob.status == "succeeded")
+            .order_by(TrainingJob.id.desc())
+            .limit(1)
+        )
+        return result.scalar_one_or_none()
+
+    async def mark_running(self, job_id: int, data_version: int) -> None:
+        await self.session.execute(
+            update(TrainingJob)
+            .where(TrainingJob.id == job_id)
+            .values(
+                status="running",
+                started_at=func.now(),
+                data_version=data_version,
+            )
+        )
+        await self.session.commit()
+
+    async def mark_finished(
+        self,
+        job_id: int,
+        samples_used: Optional[int] = None,
+        error: Optional[str] = None,
+    ) -> None:
+        await self.session.execute(
+            update(TrainingJob)
+            .where(TrainingJob.id == job_id)
+            .values(
+                status="failed" if error else "succeeded",
+                finished_at=func.now(),
+                samples_used=samples_used,
+                error=error,
+            )
+        )
+        await self.session.commit()
@@ -1,19 +1,18 @@
 from fastapi import APIRouter, Depends, status, HTTPException
+from fastapi.responses import JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import settings
 from app.database import get_db
 from app.schemas.collect import CollectData
-from app.schemas.user import UserCreate
-from app.schemas.place import PlaceCreate
-from app.schemas.location import LocationCreate
 from app.schemas.sample import SampleCreate
 from app.schemas.rssi_value import RSSIValueCreate
-from app.repositories.user import UserRepository
-from app.repositories.place import PlaceRepository
-from app.repositories.location import LocationRepository
+from app.repositories.fingerprint_stat import FingerprintStatRepository
+from app.repositories.hierarchy import HierarchyRepository
 from app.repositories.sample import SampleRepository
-from app.models.user import User
-from app.models.place import Place
-from app.models.location import Location
+from app.services.hierarchy_cache import hierarchy_cache
+from app.services.ingest_queue import ingest_queue, QueueFull
+from app.services.metrics import observe_stages, stage
+import time
 import logging
 
 router = APIRouter(prefix="/collect", tags=["data-collection"])
@@ -24,78 +23,105 @@ async def collect_data(data: CollectData, db: AsyncSession = Depends(get_db)):
     """
     Collect WiFi fingerprinting data including user, place, location, and RSSI samples.
     The entire operation is wrapped in a transaction.
+
+    With INGEST_ASYNC enabled, the validated payload is queued instead and the
+    response is 202 with a receipt ID; background writers insert it in batches.
     """
+    if settings.INGEST_ASYNC:
+        try:
+            with stage("collect", "enqueue"):
+                receipt_id = await ingest_queue.submit(data)
+        except QueueFull:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Ingestion queue is full, retry later",
+                headers={"Retry-After": "1"},
+            )
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content={
+                "message": "Data accepted for ingestion",
+                "receipt_id": receipt_id,
+                "details": {"samples_accepted": len(data.samples)},
+            },
+        )
+
+    hierarchy_key = (data.username, data.place, data.location)
+    cached_ids = hierarchy_cache.get(hierarchy_key)
+
     try:
         # Start transaction
         async with db.begin():
-            # Get or create user
-            user_repo = UserRepository(db)
-            user = await user_repo.get_user_by_username(data.username)
-            if not user:
-                # Don't commit inside here - let the outer transaction handle it
-                user_create = UserCreate(username=data.username)
-                new_user = User(**user_create.model_dump())
-                db.add(new_user)
-                await db.flush()
-                user = new_user
-
-            # Get or create place
-            place_repo = PlaceRepository(db)
-            place = await place_repo.get_place_by_name(user.id, data.place)
-            if not place:
-                # Don't commit inside here - let the outer transaction handle it
-                place_create = PlaceCreate(name=data.place, user_id=user.id)
-                new_place = Place(**place_create.model_dump())
-                db.add(new_place)
-                await db.flush()
-                place = new_place
-
-            # Get or create location
-            location_repo = LocationRepository(db)
-            location = await location_repo.get_location_by_name(place.id, data.location)
-            if not location:
-                # Don't commit inside here - let the outer transaction handle it
-                location_create = LocationCreate(name=data.location, place_id=place.id)
-                new_location = Location(**location_create.model_dump())
-                db.add(new_location)
-                await db.flush()
-                location = new_location
+            if cached_ids is not None:
+                user_id, place_id, location_id = cached_ids
+            else:
+                # Get or create user, place and location in one round trip
+                with stage("collect", "hierarchy"):
+                    hierarchy_repo = HierarchyRepository(db)
+                    user_id, place_id, location_id = await hierarchy_repo.resolve(
+                        data.username, data.place, data.location
+                    )
 
             # Create samples with RSSI values
             sample_repo = SampleRepository(db)
             samples_created = 0
+            located_samples = [(location_id, sample) for sample in data.samples]
 
-            for sample in data.samples:
-                # Convert RSSI dict to list of RSSIValueCreate
-                rssi_values = [
-                    RSSIValueCreate(bssid=bssid, rssi=rssi)
-                    for bssid, rssi in sample.rssi_values.items()
-                ]
+            # Before the samples, whose insert locks the place until the commit
+            if settings.FINGERPRINT_STATS:
+                with stage("collect", "stats"):
+                    await FingerprintStatRepository(db).record_samples(located_samples)
 
-                # Create sample with timestamp
-                # Note: The SampleRepository now shouldn't commit either
-                new_sample = await sample_repo.create_sample(
-                    SampleCreate(
-                        location_id=location.id,
-                        timestamp=sample.timestamp,
-                        rssi_values=rssi_values,
+            with stage("collect", "insert"):
+                if settings.COLLECT_BULK_INSERT:
+                    # One multi-row insert for samples and one for RSSI values
+                    sample_ids = await sample_repo.bulk_create_samples(
+                        located_samples, packed=settings.RSSI_STORAGE == "packed"
                     )
-                )
-                samples_created += 1
+                    samples_created = len(sample_ids)
+                else:
+                    for sample in data.samples:
+                        # Convert RSSI dict to list of RSSIValueCreate
+                        rssi_values = [
+                            RSSIValueCreate(bssid=bssid, rssi=rssi)
+                            for bssid, rssi in sample.rssi_values.items()
+                        ]
+
+                        # Create sample with timestamp
+                        # Note: The SampleRepository now shouldn't commit either
+                        new_sample = await sample_repo.create_sample(
+                            SampleCreate(
+                                location_id=location_id,
+                                timestamp=sample.timestamp,
+                                rssi_values=rssi_values,
+                            ),
+                            packed=settings.RSSI_STORAGE == "packed",
+                        )
+                        samples_created += 1
+
+            commit_started = time.perf_counter()
 
         # Transaction completed successfully - the async with block handles the commit
+        observe_stages("collect", {"commit": time.perf_counter() - commit_started})
+        # Only cache IDs once they are committed
+        if cached_ids is None:
+            hierarchy_cache.set(hierarchy_key, (user_id, place_id, location_id))
+
         return {
             "message": "Data collected successfully",
             "details": {
-                "user_id": user.id,
-                "place_id": place.id,
-                "location_id": location.id,
+                "user_id": user_id,
+                "place_id": place_id,
+                "location_id": location_id,
                 "samples_collected": samples_created,
             },
         }
 
     except Exception as e:
         # No need to rollback manually, the context manager will do it
+        if cached_ids is not None:
+            # The cached IDs may be stale (e.g. the location was deleted)
+            hierarchy_cache.invalidate_where(lambda key, _: key == hierarchy_key)
         logging.error(f"Data collection failed: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -1,14 +1,20 @@
 import os
-import csv
-from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.responses import FileResponse
+import time
+import importlib.util
+from datetime import datetime, timezone
+from typing import Optional
+from email.utils import format_datetime, parsedate_to_datetime
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from app.database import get_db
 from app.models.place import Place
 from app.models.location import Location
-from app.models.sample import Sample
-from app.models.rssi_value import RSSIValue
+from app.services.executor import run_io_bound
+from app.services.export_cache import cached_export_path, export_cache, stream_delta
+from app.services.export_formats import ExportFormat
+from app.services.metrics import observe_stages, stage
 import logging
 
 # Create output directory if it doesn't exist
@@ -19,14 +25,86 @@ os.makedirs(OUTPUT_DIR, exist_ok=True)
 
 router = APIRouter(prefix="/output", tags=["data-export"])
 
+# Times a request re-checks the cache after a build it joined went away
+MAX_EXPORT_ATTEMPTS = 3
 
-@router.get("/{place_id}", response_class=FileResponse)
-async def export_place_data(place_id: int, db: AsyncSession = Depends(get_db)):
+
+def _http_date(value: datetime) -> str:
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is None:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
+def _not_modified_since(request: Request, last_modified: datetime) -> bool:
+    """If-Modified-Since check, only used when the client sent no If-None-Match."""
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None or "if-none-match" in request.headers:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    # HTTP dates have a resolution of one second
+    return last_modified.replace(microsecond=0) <= since
+
+
+@router.get("/{place_id}", response_class=StreamingResponse)
+async def export_place_data(
+    place_id: int,
+    request: Request,
+    export_format: ExportFormat = Query(ExportFormat.csv, alias="format"),
+    since_version: Optional[int] = Query(None, ge=0),
+    since_sample_id: Optional[int] = Query(None, ge=0),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_db),
+):
     """
     Export all RSSI data for a specific place to a CSV file format compatible with whereami.
-    The file is saved in the output directory as place_name.csv.
+    The CSV is streamed to the client as place_name.csv and also saved in the output
+    directory, as place_id-vN.csv for data version N.
+
+    format=long-csv, parquet or arrow export the sparse long layout instead, one
+    (location, sample_id, timestamp, bssid, rssi) row per reading, as CSV, zstd
+    Parquet or an Arrow IPC stream (the last two need pyarrow).
+
+    Exports are cached per data version of the place, which every insert, change
+    or deletion of its samples bumps, and served with an ETag and Last-Modified,
+    so conditional requests get a 304. Concurrent requests for a version that is
+    not cached yet share a single build.
+
+    since_version, since_sample_id and/or since (a sample timestamp) make it a
+    delta export of only the newer samples, streamed without being cached or
+    saved. The X-Next-Cursor header holds the since_version to pass on the next
+    sync: data versions follow commit order, so unlike sample IDs no sample
+    committed late is skipped. Samples edited since the cursor are sent again
+    (clients should upsert by sample_id); deletions are not reported. A wide CSV
+    delta only has columns for the BSSIDs seen in the delta.
+
+    until (exclusive) bounds the sample timestamps from above; with since it
+    exports a time window, which prunes the partitions of a partitioned samples
+    table. Windowed exports are streamed like deltas, without X-Next-Cursor when
+    until is given.
     """
+    if (
+        export_format in (ExportFormat.parquet, ExportFormat.arrow)
+        and importlib.util.find_spec("pyarrow") is None
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail=f"The {export_format.value} format requires pyarrow to be installed",
+        )
+
     try:
+        lookup_started = time.perf_counter()
         # Get the place information
         place_result = await db.execute(select(Place).where(Place.id == place_id))
         place = place_result.scalar_one_or_none()
@@ -37,91 +115,99 @@ async def export_place_data(place_id: int, db: AsyncSession = Depends(get_db)):
                 detail=f"Place with ID {place_id} not found",
             )
 
-        # Create CSV filename
+        # Create export filename
         place_name = place.name.replace(" ", "_").lower()
-        csv_filename = f"{place_name}.csv"
-        csv_path = os.path.join(OUTPUT_DIR, csv_filename)
+        export_filename = export_format.filename(place_name)
 
-        # Get all locations for this place
+        # Check that the place has locations
         locations_result = await db.execute(
-            select(Location).where(Location.place_id == place_id)
+            select(Location.id).where(Location.place_id == place_id).limit(1)
         )
-        locations = locations_result.scalars().all()
-
-        if not locations:
+        if locations_result.scalar_one_or_none() is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"No locations found for place with ID {place_id}",
             )
 
-        # Dictionary to hold all unique BSSIDs
-        all_bssids = set()
-
-        # Dictionary to hold all samples by location
-        samples_by_location = {}
-
-        # Collect all data
-        for location in locations:
-            # Get samples for this location
-            samples_result = await db.execute(
-                select(Sample).where(Sample.location_id == location.id)
+        # Bumped by every write to the place's samples (Place.data_version); the
+        # export is only rebuilt when it changes
+        version = place.data_version
+        if version == 0:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"No RSSI data found for place with ID {place_id}",
+            )
+        observe_stages("export", {"lookup": time.perf_counter() - lookup_started})
+
+        if (
+            since_version is not None
+            or since_sample_id is not None
+            or since is not None
+            or until is not None
+        ):
+            if since is not None and since.tzinfo is None:
+                since = since.replace(tzinfo=timezone.utc)
+            if until is not None and until.tzinfo is None:
+                until = until.replace(tzinfo=timezone.utc)
+            delta_filename = export_format.filename(f"{place_name}_delta")
+            headers = {"Content-Disposition": f"attachment; filename={delta_filename}"}
+            if until is None:
+                # Samples committed while the delta streams are left for the next cursor
+                headers["X-Next-Cursor"] = str(max(version, since_version or 0))
+            return StreamingResponse(
+                stream_delta(
+                    place_id, export_format, version, since_version, since_sample_id, since, until
+                ),
+                media_type=export_format.media_type,
+                headers=headers,
             )
-            samples = samples_result.scalars().all()
-
-            if not samples:
-                continue
-
-            # Initialize samples for this location
-            samples_by_location[location.name] = []
 
-            # Get RSSI values for each sample
-            for sample in samples:
-                rssi_values_result = await db.execute(
-                    select(RSSIValue).where(RSSIValue.sample_id == sample.id)
+        export_path = cached_export_path(OUTPUT_DIR, place_id, export_format, version)
+        etag = f'"{place_id}-v{version}-{export_format.value}"'
+        headers = {"ETag": etag}
+        if _etag_matches(request, etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        for _ in range(MAX_EXPORT_ATTEMPTS):
+            with stage("export", "cache"):
+                cached = await export_cache.open_cached(export_path, place_id, export_format, version)
+            if cached is not None:
+                meta, reader = cached
+                built_at = datetime.fromisoformat(meta["built_at"])
+                headers["Last-Modified"] = _http_date(built_at)
+                if _not_modified_since(request, built_at):
+                    reader.close()
+                    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+                headers["Content-Length"] = str(os.fstat(reader.fileno()).st_size)
+                headers["Content-Disposition"] = f"attachment; filename={export_filename}"
+                return StreamingResponse(
+                    export_cache.read(reader),
+                    media_type=export_format.media_type,
+                    headers=headers,
                 )
-                rssi_values = rssi_values_result.scalars().all()
-
-                # Convert to dictionary for easier processing
-                rssi_dict = {rssi.bssid: rssi.rssi for rssi in rssi_values}
 
-                # Add to all BSSIDs
-                all_bssids.update(rssi_dict.keys())
-
-                # Add to samples for this location
-                samples_by_location[location.name].append(rssi_dict)
+            # Not cached yet: join the build in progress or start one, and stream
+            # the file as it is written
+            build = export_cache.get_build(export_path, place_id, export_format, version)
+            try:
+                reader = await run_io_bound(open, build.tmp_path, "rb")
+            except FileNotFoundError:
+                # The build finished (or failed) in the meantime
+                await build.wait()
+                continue
 
-        if not all_bssids:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"No RSSI data found for place with ID {place_id}",
+            headers["Last-Modified"] = _http_date(build.built_at)
+            headers["Content-Disposition"] = f"attachment; filename={export_filename}"
+            return StreamingResponse(
+                export_cache.follow(build, reader),
+                media_type=export_format.media_type,
+                headers=headers,
             )
 
-        # Sort BSSIDs for consistent column order
-        sorted_bssids = sorted(list(all_bssids))
-
-        # CSV header: "location" + all BSSIDs
-        header = ["location"] + sorted_bssids
-
-        # Open CSV file for writing
-        with open(csv_path, "w", newline="") as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow(header)
-
-            # Write data for each location and sample
-            for location_name, samples in samples_by_location.items():
-                for sample in samples:
-                    row = [location_name]
-                    # Add RSSI value for each BSSID, or -100 if not detected
-                    for bssid in sorted_bssids:
-                        row.append(sample.get(bssid, -100))
-                    writer.writerow(row)
-
-        # Return the CSV file
-        return FileResponse(
-            path=csv_path,
-            filename=csv_filename,
-            media_type="text/csv",
-            headers={"Content-Disposition": f"attachment; filename={csv_filename}"},
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Export for place with ID {place_id} could not be built, retry later",
+            headers={"Retry-After": "1"},
         )
 
     except HTTPException:
@@ -1,26 +1,35 @@
 # app/routes/predict.py
 import os
+import csv
 import json
+import codecs
 import logging
-from typing import Dict, List, Any
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, HTTPException, Depends
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from app.database import get_db
-from app.models.place import Place
-from whereami.predict import predict_proba
-
-# Define the directory where trained models are stored
-TRAINED_DIR = os.path.join(
-    os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "trained"
-)
+import tempfile
+from typing import Dict, List, Any, Optional
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from pydantic import ValidationError
+from app.config import settings
+from app.schemas.predict import ScanInput
+from app.services.batcher import batch_scheduler
+from app.services.executor import run_cpu_bound, run_io_bound
+from app.services.metrics import PREDICTIONS, PREDICTIONS_GATED, WEBSOCKET_CONNECTIONS, stage
+from app.services.model_registry import model_registry
+from app.services.place_catalog import place_catalog
+from app.services.prediction import predict_place_rows, predict_place_top
+from app.services.smoothing import PredictionSmoother
+from app.services.ws_protocol import ProtocolError, decode_scan, encode_prediction, negotiate
 
 router = APIRouter(prefix="/predict", tags=["prediction"])
 
 
 @router.websocket("/{place_id}")
 async def predict_location(
-    websocket: WebSocket, place_id: int, db: AsyncSession = Depends(get_db)
+    websocket: WebSocket,
+    place_id: int,
+    smoothing: Optional[str] = None,
+    gate_db: Optional[float] = None,
 ):
     """
     WebSocket endpoint for real-time location prediction.
@@ -29,13 +38,31 @@ async def predict_location(
     2. Client sends RSSI data in the format: {"rssi_values": {"BSSID1": RSSI1, "BSSID2": RSSI2, ...}}
     3. Server responds with the predicted location name
     4. Connection remains open until client disconnects
+
+    Clients can negotiate a compact protocol through the WebSocket subprotocol
+    header: dishasarthi.msgpack.v1 (binary MessagePack frames) or
+    dishasarthi.json.v1 (JSON text frames). The connect message then carries the
+    place's BSSID "vocabulary", scans are sent as vocabulary indices
+    {"i": [index, ...], "r": [rssi, ...]} (optionally with "k", the number of top
+    locations wanted, up to PREDICT_MAX_TOP_K) and replies are {"p": location, "c": confidence,
+    "k": [[location, confidence], ...]} with the PREDICT_TOP_K best locations.
+
+    Predictions can be smoothed across the scans of a connection (see
+    PREDICT_SMOOTHING and PredictionSmoother). The ?smoothing=none|ema|hmm and
+    ?gate_db= query parameters override the server defaults per connection.
     """
     try:
-        # Check if place exists
-        place_result = await db.execute(select(Place).where(Place.id == place_id))
-        place = place_result.scalar_one_or_none()
+        try:
+            smoother = PredictionSmoother.from_settings(smoothing, gate_db)
+        except ValueError as e:
+            await websocket.close(code=4000, reason=str(e))
+            return
+
+        # Answered from the in-memory catalog, so idle sockets hold no pooled
+        # database connection
+        place = await place_catalog.get(place_id)
 
-        if not place:
+        if not place.exists:
             # Can't use HTTPException in websocket connections, so we'll close with an error code
             await websocket.close(
                 code=4004, reason=f"Place with ID {place_id} not found"
@@ -43,71 +70,124 @@ async def predict_location(
             return
 
         # Check if trained model exists for this place
-        model_dir = os.path.join(TRAINED_DIR, str(place_id))
-        if not os.path.exists(model_dir):
+        if not place.has_model:
             await websocket.close(
                 code=4004, reason=f"No trained model found for place ID {place_id}"
             )
             return
 
-        # Accept the connection
-        await websocket.accept()
-
-        # Send initial message
-        await websocket.send_text(
-            json.dumps(
-                {
-                    "status": "connected",
-                    "message": f"Connected to prediction service for {place.name}",
-                    "place_id": place_id,
-                }
+        codec = negotiate(websocket.scope.get("subprotocols", []))
+        if codec is None:
+            await websocket.accept()
+            with WEBSOCKET_CONNECTIONS.labels("json").track_inprogress():
+                await _serve_json(websocket, place_id, place.name, smoother)
+            return
+
+        # Compact clients address BSSIDs by their index in the model's vocabulary
+        try:
+            vocabulary = await place_catalog.vocabulary(place)
+        except (FileNotFoundError, ValueError):
+            await websocket.close(
+                code=4004,
+                reason=f"The model for place ID {place_id} has no BSSID vocabulary, retrain it",
             )
+            return
+        await websocket.accept(subprotocol=codec.subprotocol)
+        with WEBSOCKET_CONNECTIONS.labels(codec.subprotocol).track_inprogress():
+            await _serve_compact(
+                websocket, place_id, place.name, codec, vocabulary, smoother
+            )
+
+    except WebSocketDisconnect:
+        logging.info(
+            f"Client disconnected from prediction service for place {place_id} "
+            f"({smoother.scored} scans scored, {smoother.gated} gated)"
+        )
+    except Exception as e:
+        logging.error(f"WebSocket error: {str(e)}")
+        try:
+            await websocket.close(code=1011, reason=f"Server error: {str(e)}")
+        except:
+            pass
+
+
+async def _predict_smoothed(
+    place_id: int, rssi_values: dict, smoother: PredictionSmoother, protocol: str
+):
+    """Score a scan through the connection's smoother, skipping the model for gated scans."""
+    PREDICTIONS.labels(str(place_id), protocol).inc()
+    scan = smoother.observe(rssi_values)
+    if scan is None:
+        PREDICTIONS_GATED.labels(str(place_id)).inc()
+        return list(smoother.result)
+    # Use the cached model of the place (see PREDICTOR_ENGINE), batched with
+    # scans from other connections to the same place
+    with stage("predict", "batch"):
+        predictions = await batch_scheduler.predict(place_id, scan)
+    return smoother.update(predictions)
+
+
+async def _serve_json(
+    websocket: WebSocket, place_id: int, place_name: str, smoother: PredictionSmoother
+) -> None:
+    """The original protocol: JSON scans keyed by BSSID, replies with every location."""
+    # Send initial message
+    await websocket.send_text(
+        json.dumps(
+            {
+                "status": "connected",
+                "message": f"Connected to prediction service for {place_name}",
+                "place_id": place_id,
+            }
         )
+    )
 
-        # Main loop for receiving and processing messages
-        while True:
-            # Wait for RSSI data from client
-            data = await websocket.receive_text()
+    # Main loop for receiving and processing messages
+    while True:
+        # Wait for RSSI data from client
+        data = await websocket.receive_text()
 
-            try:
-                # Parse the received data
+        try:
+            # Parse the received data
+            with stage("predict", "decode"):
                 rssi_data = json.loads(data)
 
-                # Validate the format
-                if not isinstance(rssi_data, dict) or "rssi_values" not in rssi_data:
-                    await websocket.send_text(
-                        json.dumps(
-                            {
-                                "error": "Invalid data format. Expected {'rssi_values': {BSSID: RSSI, ...}}"
-                            }
-                        )
+            # Validate the format
+            if not isinstance(rssi_data, dict) or "rssi_values" not in rssi_data:
+                await websocket.send_text(
+                    json.dumps(
+                        {
+                            "error": "Invalid data format. Expected {'rssi_values': {BSSID: RSSI, ...}}"
+                        }
                     )
-                    continue
+                )
+                continue
 
-                # Extract RSSI values
-                rssi_values = rssi_data["rssi_values"]
-                if not isinstance(rssi_values, dict):
-                    await websocket.send_text(
-                        json.dumps(
-                            {
-                                "error": "Invalid RSSI values format. Expected {BSSID: RSSI, ...}"
-                            }
-                        )
+            # Extract RSSI values
+            rssi_values = rssi_data["rssi_values"]
+            if not isinstance(rssi_values, dict):
+                await websocket.send_text(
+                    json.dumps(
+                        {
+                            "error": "Invalid RSSI values format. Expected {BSSID: RSSI, ...}"
+                        }
                     )
-                    continue
+                )
+                continue
 
-                # Use whereami to predict location
-                # The predict_proba function expects a dictionary with BSSID keys and RSSI values
-                prediction_result = predict_proba(rssi_values, model_path=model_dir)
+            prediction_result = await _predict_smoothed(
+                place_id, rssi_values, smoother, "json"
+            )
 
-                # Extract the most likely location and its probability
-                if prediction_result and len(prediction_result) > 0:
-                    # prediction_result is a list of (location, probability) tuples
-                    # Sort by probability (descending) and take the top result
-                    prediction_result.sort(key=lambda x: x[1], reverse=True)
-                    top_location, confidence = prediction_result[0]
+            # Extract the most likely location and its probability
+            if prediction_result and len(prediction_result) > 0:
+                # prediction_result is a list of (location, probability) tuples
+                # Sort by probability (descending) and take the top result
+                prediction_result.sort(key=lambda x: x[1], reverse=True)
+                top_location, confidence = prediction_result[0]
 
-                    # Send prediction to client
+                # Send prediction to client
+                with stage("predict", "reply"):
                     await websocket.send_text(
                         json.dumps(
                             {
@@ -120,32 +200,361 @@ async def predict_location(
                             }
                         )
                     )
-                else:
-                    await websocket.send_text(
-                        json.dumps(
-                            {
-                                "error": "Could not make a prediction",
-                                "prediction": None,
-                                "confidence": 0.0,
-                            }
-                        )
+            else:
+                await websocket.send_text(
+                    json.dumps(
+                        {
+                            "error": "Could not make a prediction",
+                            "prediction": None,
+                            "confidence": 0.0,
+                        }
                     )
+                )
 
-            except json.JSONDecodeError:
-                await websocket.send_text(json.dumps({"error": "Invalid JSON format"}))
-            except Exception as e:
-                logging.error(f"Prediction error: {str(e)}")
-                await websocket.send_text(
-                    json.dumps({"error": f"Prediction failed: {str(e)}"})
+        except json.JSONDecodeError:
+            await websocket.send_text(json.dumps({"error": "Invalid JSON format"}))
+        except Exception as e:
+            logging.error(f"Prediction error: {str(e)}")
+            await websocket.send_text(
+                json.dumps({"error": f"Prediction failed: {str(e)}"})
+            )
+
+
+async def _send(websocket: WebSocket, codec, message: dict) -> None:
+    if codec.binary:
+        await websocket.send_bytes(codec.dumps(message))
+    else:
+        await websocket.send_text(codec.dumps(message))
+
+
+async def _serve_compact(
+    websocket: WebSocket,
+    place_id: int,
+    place_name: str,
+    codec,
+    vocabulary: list[str],
+    smoother: PredictionSmoother,
+) -> None:
+    """The negotiated compact protocol, see predict_location."""
+    await _send(
+        websocket,
+        codec,
+        {
+            "status": "connected",
+            "message": f"Connected to prediction service for {place_name}",
+            "place_id": place_id,
+            "vocabulary": vocabulary,
+        },
+    )
+
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", 1000))
+        # Either frame type is accepted, whichever the codec produces
+        data = message.get("bytes") if message.get("bytes") is not None else message.get("text")
+
+        try:
+            with stage("predict", "decode"):
+                rssi_values, top_k = decode_scan(
+                    codec.loads(data), vocabulary, settings.PREDICT_MAX_TOP_K
                 )
+            predictions = await _predict_smoothed(
+                place_id, rssi_values, smoother, codec.subprotocol
+            )
+            reply = encode_prediction(predictions, top_k or settings.PREDICT_TOP_K)
+        except ProtocolError as e:
+            reply = {"error": str(e)}
+        except Exception as e:
+            logging.error(f"Prediction error: {str(e)}")
+            reply = {"error": f"Prediction failed: {str(e)}"}
+        with stage("predict", "reply"):
+            await _send(websocket, codec, reply)
 
-    except WebSocketDisconnect:
-        logging.info(
-            f"Client disconnected from prediction service for place {place_id}"
-        )
+
+# Batch request bodies are spooled to a temporary file past this size
+BATCH_SPOOL_MAX_BYTES = 8 * 1024 * 1024
+
+# Bytes read from the spooled body at a time
+BATCH_READ_CHUNK_BYTES = 64 * 1024
+
+
+async def _spool_body(request: Request) -> tempfile.SpooledTemporaryFile:
+    """
+    Receive the whole request body into a spooled temporary file. It has to be
+    consumed before the response starts, since the streaming response listens
+    for disconnects on the same channel.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=BATCH_SPOOL_MAX_BYTES)
+    try:
+        async for chunk in request.stream():
+            await run_io_bound(spool.write, chunk)
+        await run_io_bound(spool.seek, 0)
+    except BaseException:
+        spool.close()
+        raise
+    return spool
+
+
+async def _read_spool(spool):
+    while True:
+        chunk = await run_io_bound(spool.read, BATCH_READ_CHUNK_BYTES)
+        if not chunk:
+            return
+        yield chunk
+
+
+async def _iter_csv_rows(chunks):
+    """Parse a body as CSV chunk by chunk."""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        lines = pending.split("\n")
+        pending = lines.pop()
+        for row in csv.reader(line.rstrip("\r") for line in lines):
+            if row:
+                yield row
+    pending += decoder.decode(b"", final=True)
+    for row in csv.reader([pending]):
+        if row:
+            yield row
+
+
+class _JSONArrayReader:
+    """
+    Incremental reader of a JSON body shaped like {"key": [item, ...], ...}. The
+    items of one top-level array are decoded one at a time with raw_decode as the
+    body is read, so the whole document is never held in memory.
+    """
+
+    def __init__(self, chunks):
+        self._chunks = aiter(chunks)
+        self._decoder = json.JSONDecoder()
+        self._text = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+
+    async def _read(self) -> bool:
+        """Append the next chunk to the unread part of the buffer; False at the end of the body."""
+        if self._eof:
+            return False
+        chunk = await anext(self._chunks, None)
+        if chunk is None:
+            self._eof = True
+            text = self._text.decode(b"", final=True)
+        else:
+            text = self._text.decode(chunk)
+        self._buffer = self._buffer[self._pos :] + text
+        self._pos = 0
+        return True
+
+    async def _peek(self) -> str:
+        """The next non-whitespace character, "" at the end of the body."""
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in " \t\r\n":
+                self._pos += 1
+            if self._pos < len(self._buffer) or not await self._read():
+                return self._buffer[self._pos : self._pos + 1]
+
+    async def _expect(self, chars: str) -> str:
+        char = await self._peek()
+        if not char or char not in chars:
+            raise ValueError(f"Invalid JSON: expected one of {chars!r}, got {char or 'the end'!r}")
+        self._pos += 1
+        return char
+
+    async def _value(self) -> Any:
+        await self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if await self._read():
+                    continue
+                raise
+            # A number cut at the end of the buffer may continue in the next chunk
+            if (
+                isinstance(value, (int, float))
+                and not self._buffer[end:].strip("+-.eE0123456789")
+                and await self._read()
+            ):
+                continue
+            self._pos = end
+            return value
+
+    async def items(self, key: str):
+        """Yield the items of the top-level array `key`, skipping the other top-level values."""
+        found = False
+        await self._expect("{")
+        if await self._peek() == "}":
+            self._pos += 1
+        else:
+            while True:
+                name = await self._value()
+                if not isinstance(name, str):
+                    raise ValueError("Invalid JSON: object keys must be strings")
+                await self._expect(":")
+                if name == key:
+                    found = True
+                    await self._expect("[")
+                    if await self._peek() == "]":
+                        self._pos += 1
+                    else:
+                        while True:
+                            yield await self._value()
+                            if await self._expect(",]") == "]":
+                                break
+                else:
+                    await self._value()
+                if await self._expect(",}") == "}":
+                    break
+        if await self._peek():
+            raise ValueError("Invalid JSON: unexpected data after the body")
+        if not found:
+            raise ValueError(f"Field {key!r} is required")
+
+
+async def _iter_scans(chunks):
+    """The rssi_values of each item of a JSON {"samples": [...]} body, validated one at a time."""
+    async for item in _JSONArrayReader(chunks).items("samples"):
+        yield ScanInput.model_validate(item).rssi_values
+
+
+async def _predict_csv(place_id: int, header: list[str], rows):
+    """
+    Score the rows of a CSV in the export format chunk by chunk and yield the NDJSON
+    lines of each chunk. When the first column is "location", it is treated as
+    the ground truth and an accuracy summary line is appended.
+    """
+    has_labels = header[0] == "location"
+    columns = header[1:] if has_labels else header
+    count = correct = 0
+    labels, chunk = [], []
+
+    async def score():
+        nonlocal count, correct
+        with stage("predict_batch", "score"):
+            results = await run_cpu_bound(predict_place_rows, place_id, columns, chunk)
+        PREDICTIONS.labels(str(place_id), "batch").inc(len(results))
+        lines = []
+        for position, (location, confidence) in enumerate(results):
+            line = {"index": count + position, "prediction": location, "confidence": confidence}
+            if has_labels:
+                line["location"] = labels[position]
+                correct += location == labels[position]
+            lines.append(json.dumps(line))
+        count += len(results)
+        return "\n".join(lines) + "\n"
+
+    try:
+        async for row in rows:
+            if has_labels:
+                labels.append(row[0])
+                row = row[1:]
+            chunk.append(row)
+            if len(chunk) >= settings.BATCH_PREDICT_CHUNK_ROWS:
+                yield await score()
+                labels, chunk = [], []
+        if chunk:
+            yield await score()
+        if has_labels and count:
+            yield json.dumps({"summary": {"count": count, "accuracy": correct / count}}) + "\n"
     except Exception as e:
-        logging.error(f"WebSocket error: {str(e)}")
-        try:
-            await websocket.close(code=1011, reason=f"Server error: {str(e)}")
-        except:
-            pass
+        logging.error(f"Batch prediction error: {str(e)}")
+        yield json.dumps({"error": f"Prediction failed: {str(e)}"}) + "\n"
+
+
+async def _predict_scans(place_id: int, scans):
+    """Stream NDJSON predictions for an iterator of scans, one chunk at a time."""
+    chunk_size = settings.BATCH_PREDICT_CHUNK_ROWS
+    count = 0
+    chunk = []
+
+    async def score():
+        with stage("predict_batch", "score"):
+            results = await run_cpu_bound(predict_place_top, place_id, chunk)
+        PREDICTIONS.labels(str(place_id), "batch").inc(len(results))
+        return "\n".join(
+            json.dumps({"index": count + position, "prediction": location, "confidence": confidence})
+            for position, (location, confidence) in enumerate(results)
+        ) + "\n"
+
+    try:
+        async for scan in scans:
+            chunk.append(scan)
+            if len(chunk) >= chunk_size:
+                yield await score()
+                count += len(chunk)
+                chunk = []
+        if chunk:
+            yield await score()
+    except Exception as e:
+        logging.error(f"Batch prediction error: {str(e)}")
+        yield json.dumps({"error": f"Prediction failed: {str(e)}"}) + "\n"
+
+
+async def _chain(first, rest):
+    yield first
+    async for item in rest:
+        yield item
+
+
+@router.post("/{place_id}/batch", response_class=StreamingResponse)
+async def predict_batch(place_id: int, request: Request):
+    """
+    Predict locations for many scans at once, e.g. to replay a recorded walk.
+
+    Accepts either JSON {"samples": [{"rssi_values": {BSSID: RSSI, ...}}, ...]} or a
+    text/csv body in the same wide format GET /output/{place_id} writes. Rows are
+    scored in chunks of BATCH_PREDICT_CHUNK_ROWS with one model call per chunk, and
+    results are streamed back as NDJSON lines {"index", "prediction", "confidence"}.
+
+    The body is spooled to a temporary file and parsed incrementally while the
+    results stream, so memory stays bounded by the chunk size. Errors found after
+    the response has started end it with an {"error": ...} line.
+    """
+    model_dir = model_registry.model_dir(place_id)
+    if not os.path.exists(model_dir):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No trained model found for place ID {place_id}",
+        )
+
+    spool = await _spool_body(request)
+    content_type = request.headers.get("content-type", "")
+    try:
+        if content_type.startswith("text/csv"):
+            rows = _iter_csv_rows(_read_spool(spool))
+            try:
+                header = await anext(rows, None)
+            except (csv.Error, UnicodeDecodeError) as e:
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    detail=f"Invalid CSV: {str(e)}",
+                )
+            body = _predict_csv(place_id, header, rows) if header is not None else iter(())
+        else:
+            # The first scan is parsed before the response starts, so a malformed
+            # body is still answered with a 422
+            scans = _iter_scans(_read_spool(spool))
+            try:
+                first = await anext(scans, None)
+            except ValidationError as e:
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    detail=e.errors(include_url=False, include_context=False),
+                )
+            except ValueError as e:
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e)
+                )
+            body = _predict_scans(place_id, _chain(first, scans)) if first is not None else iter(())
+    except BaseException:
+        spool.close()
+        raise
+
+    return StreamingResponse(
+        body, media_type="application/x-ndjson", background=BackgroundTask(spool.close)
+    )
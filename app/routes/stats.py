@@ -0,0 +1,28 @@
+from typing import Optional
+from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_db
+from app.repositories.fingerprint_stat import FingerprintStatRepository
+from app.repositories.place import PlaceRepository
+from app.schemas.fingerprint_stat import FingerprintStatResponse
+
+router = APIRouter(prefix="/stats", tags=["statistics"])
+
+
+@router.get("/{place_id}", response_model=list[FingerprintStatResponse])
+async def get_fingerprint_stats(
+    place_id: int,
+    location_id: Optional[int] = None,
+    min_count: int = 1,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Per-location, per-BSSID RSSI statistics (count, mean, standard deviation,
+    min/max, last seen) of a place. They are kept up to date on ingest, so this
+    does not scan the raw samples.
+    """
+    # Raises 404 if the place does not exist
+    await PlaceRepository(db).get_place(place_id)
+    return await FingerprintStatRepository(db).get_place_stats(
+        place_id, location_id=location_id, min_count=min_count
+    )
@@ -0,0 +1,85 @@
+from datetime import datetime, timezone
+from typing import Optional
+from fastapi import APIRouter, Depends, status
+from fastapi.responses import JSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_db
+from app.repositories.place import PlaceRepository
+from app.repositories.training_job import TrainingJobRepository
+from app.schemas.training_job import TrainingJobResponse
+from app.services.training import training_service
+
+router = APIRouter(prefix="/train", tags=["training"])
+
+
+@router.post("/{place_id}", status_code=status.HTTP_202_ACCEPTED)
+async def start_training(
+    place_id: int,
+    force: bool = False,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Start training a model for a place from the samples in the database.
+
+    Returns 200 without starting a job when no samples arrived since the last
+    successful model (unless force=true), and the running job if one is already
+    in progress for this place.
+
+    since and/or until (exclusive) train on the samples taken in that time window
+    only, e.g. after an access point refresh. A windowed job always runs, and its
+    model is not up to date for a later call without a window.
+    """
+    # Raises 404 if the place does not exist
+    await PlaceRepository(db).get_place(place_id)
+
+    if since is not None and since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    if until is not None and until.tzinfo is None:
+        until = until.replace(tzinfo=timezone.utc)
+
+    # Checked and claimed in one step, so concurrent requests cannot both start a job
+    while not training_service.reserve(place_id):
+        running_job_id = await training_service.running_job(place_id)
+        if running_job_id is not None:
+            job = await TrainingJobRepository(db).get_job(running_job_id)
+            return {
+                "message": "Training already in progress",
+                "job": TrainingJobResponse.model_validate(job),
+            }
+
+    job = None
+    try:
+        if not force and since is None and until is None:
+            last_job = await training_service.is_up_to_date(db, place_id)
+            if last_job is not None:
+                return JSONResponse(
+                    status_code=status.HTTP_200_OK,
+                    content={
+                        "message": "Model is up to date, no new samples since the last training",
+                        "job": TrainingJobResponse.model_validate(last_job).model_dump(mode="json"),
+                    },
+                )
+
+        job = await training_service.start(db, place_id, since=since, until=until)
+    finally:
+        if job is None:
+            training_service.release(place_id)
+
+    return {
+        "message": "Training started",
+        "job": TrainingJobResponse.model_validate(job),
+    }
+
+
+@router.get("/jobs/{job_id}", response_model=TrainingJobResponse)
+async def get_training_job(job_id: int, db: AsyncSession = Depends(get_db)):
+    """Status of a training job."""
+    return await TrainingJobRepository(db).get_job(job_id)
+
+
+@router.get("/{place_id}/jobs", response_model=list[TrainingJobResponse])
+async def list_training_jobs(place_id: int, db: AsyncSession = Depends(get_db)):
+    """Most recent training jobs for a place, newest first."""
+    return await TrainingJobRepository(db).get_jobs(place_id)
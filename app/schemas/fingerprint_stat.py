@@ -0,0 +1,17 @@
+from pydantic import BaseModel, ConfigDict
+from datetime import datetime
+from typing import Optional
+
+
+class FingerprintStatResponse(BaseModel):
+    location_id: int
+    location: str
+    bssid: str
+    sample_count: int
+    mean_rssi: float
+    std_rssi: float
+    min_rssi: int
+    max_rssi: int
+    last_seen: Optional[datetime] = None
+
+    model_config = ConfigDict(from_attributes=True)
@@ -0,0 +1,6 @@
+from pydantic import BaseModel
+from typing import Dict
+
+
+class ScanInput(BaseModel):
+    rssi_values: Dict[str, int]  # BSSID: RSSI value
@@ -0,0 +1,19 @@
+from pydantic import BaseModel, ConfigDict
+from datetime import datetime
+from typing import Optional
+
+
+class TrainingJobResponse(BaseModel):
+    id: int
+    place_id: int
+    status: str
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    data_version: Optional[int] = None
+    since: Optional[datetime] = None
+    until: Optional[datetime] = None
+    samples_used: Optional[int] = None
+    error: Optional[str] = None
+
+    model_config = ConfigDict(from_attributes=True)
@@ -0,0 +1,119 @@
+import asyncio
+import logging
+from typing import Optional
+from app.config import settings
+from app.services.executor import run_cpu_bound
+from app.services.metrics import PREDICT_BATCH_SIZE, observe_stages
+from app.services.prediction import predict_place_batch_timed
+
+
+class PredictionBatcher:
+    """
+    Micro-batches scans for one place. The first queued scan opens a window of
+    `window` seconds (or until `max_size` scans are queued); everything collected
+    in that window is scored with a single predict_proba call and each result is
+    handed back to the caller that submitted it.
+    """
+
+    def __init__(self, place_id: int, window: float, max_size: int, max_inflight: int):
+        self.place_id = place_id
+        self.window = window
+        self.max_size = max_size
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._inflight = asyncio.Semaphore(max_inflight)
+        self._task: Optional[asyncio.Task] = None
+        self._scoring: set[asyncio.Task] = set()
+
+    async def predict(self, rssi_values: dict[str, int]) -> list[tuple[str, float]]:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((rssi_values, future))
+        return await future
+
+    async def _collect(self) -> list:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.window
+        while len(batch) < self.max_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._collect()
+            # Keep collecting the next batch while this one is being scored, up to
+            # one batch in flight per worker
+            await self._inflight.acquire()
+            task = asyncio.create_task(self._score(batch))
+            self._scoring.add(task)
+            task.add_done_callback(self._scoring.discard)
+
+    async def _score(self, batch: list) -> None:
+        try:
+            results, timings = await run_cpu_bound(
+                predict_place_batch_timed, self.place_id, [scan for scan, _ in batch]
+            )
+        except Exception as e:
+            logging.error(f"Batch prediction failed for place {self.place_id}: {str(e)}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            PREDICT_BATCH_SIZE.observe(len(batch))
+            observe_stages("predict", timings)
+            for (_, future), result in zip(batch, results):
+                # The socket may have gone away while the batch was scored
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            self._inflight.release()
+
+    async def close(self) -> None:
+        tasks = list(self._scoring)
+        if self._task is not None:
+            tasks.append(self._task)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+class BatchScheduler:
+    """Routes scans to one PredictionBatcher per place."""
+
+    def __init__(self, window: float, max_size: int, max_inflight: int):
+        self.window = window
+        self.max_size = max_size
+        self.max_inflight = max_inflight
+        self._batchers: dict[int, PredictionBatcher] = {}
+
+    async def predict(
+        self, place_id: int, rssi_values: dict[str, int]
+    ) -> list[tuple[str, float]]:
+        batcher = self._batchers.get(place_id)
+        if batcher is None:
+            batcher = PredictionBatcher(
+                place_id, self.window, self.max_size, self.max_inflight
+            )
+            self._batchers[place_id] = batcher
+        return await batcher.predict(rssi_values)
+
+    async def close(self) -> None:
+        await asyncio.gather(*(batcher.close() for batcher in self._batchers.values()))
+        self._batchers.clear()
+
+
+batch_scheduler = BatchScheduler(
+    window=settings.PREDICT_BATCH_WINDOW_MS / 1000,
+    max_size=settings.PREDICT_BATCH_MAX_SIZE,
+    max_inflight=settings.EXECUTOR_MAX_WORKERS,
+)
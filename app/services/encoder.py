@@ -0,0 +1,71 @@
+import os
+import json
+from typing import Mapping, Sequence
+import numpy as np
+
+# RSSI used for access points that were not detected in a scan
+MISSING_RSSI = -100
+
+# BSSID vocabulary saved next to the model in trained/<place_id>/
+VOCABULARY_FILE = "bssids.json"
+
+
+class BSSIDEncoder:
+    """
+    Fixed BSSID -> column mapping for a place. Scans are encoded into preallocated
+    arrays filled with MISSING_RSSI, so the CSV export, training and prediction all
+    agree on the same column order.
+    """
+
+    def __init__(self, bssids: Sequence[str], dtype=np.float32):
+        self.bssids = list(bssids)
+        self.index = {bssid: column for column, bssid in enumerate(self.bssids)}
+        self.dtype = dtype
+
+    def __len__(self) -> int:
+        return len(self.bssids)
+
+    def encode(self, rssi_values: Mapping[str, int]) -> np.ndarray:
+        """Encode one {bssid: rssi} scan; unknown BSSIDs are ignored."""
+        return self.encode_batch([rssi_values])[0]
+
+    def encode_batch(self, scans: Sequence[Mapping[str, int]]) -> np.ndarray:
+        """Encode a list of {bssid: rssi} scans into an (n_scans, n_bssids) matrix."""
+        matrix = np.full((len(scans), len(self.bssids)), MISSING_RSSI, dtype=self.dtype)
+        lookup = self.index.get
+        rows, columns, values = [], [], []
+        for row, scan in enumerate(scans):
+            for bssid, rssi in scan.items():
+                column = lookup(bssid)
+                if column is not None:
+                    rows.append(row)
+                    columns.append(column)
+                    values.append(rssi)
+        if rows:
+            matrix[rows, columns] = values
+        return matrix
+
+    def encode_dense(self, columns: Sequence[str], rows: np.ndarray) -> np.ndarray:
+        """
+        Re-order a dense (n_scans, len(columns)) matrix whose columns are named by
+        BSSID into this encoder's column order. Unknown columns are dropped and
+        missing ones are filled with MISSING_RSSI.
+        """
+        matrix = np.full((rows.shape[0], len(self.bssids)), MISSING_RSSI, dtype=self.dtype)
+        targets = np.array([self.index.get(column, -1) for column in columns], dtype=np.intp)
+        known = targets >= 0
+        matrix[:, targets[known]] = rows[:, known]
+        return matrix
+
+    def save(self, model_dir: str) -> None:
+        """Write the vocabulary to model_dir, replacing any previous one atomically."""
+        path = os.path.join(model_dir, VOCABULARY_FILE)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.bssids, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, model_dir: str, dtype=np.float32) -> "BSSIDEncoder":
+        with open(os.path.join(model_dir, VOCABULARY_FILE)) as f:
+            return cls(json.load(f), dtype=dtype)
@@ -0,0 +1,72 @@
+import asyncio
+import functools
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+from app.config import settings
+
+# Pools are created lazily so that importing this module (e.g. from a process pool
+# worker) does not spawn threads or processes
+_cpu_executor: Optional[Executor] = None
+_io_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_cpu_executor() -> Executor:
+    """Executor for CPU-bound work such as model inference."""
+    global _cpu_executor
+    if _cpu_executor is None:
+        if settings.EXECUTOR_KIND == "process":
+            # spawn, like the training pool: forking a process that runs an event
+            # loop, asyncpg connections and thread pools is unsafe
+            _cpu_executor = ProcessPoolExecutor(
+                max_workers=settings.EXECUTOR_MAX_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        elif settings.EXECUTOR_KIND == "thread":
+            _cpu_executor = ThreadPoolExecutor(
+                max_workers=settings.EXECUTOR_MAX_WORKERS, thread_name_prefix="cpu"
+            )
+        else:
+            raise ValueError(
+                f"Unknown EXECUTOR_KIND {settings.EXECUTOR_KIND!r}, expected 'thread' or 'process'"
+            )
+    return _cpu_executor
+
+
+def get_io_executor() -> ThreadPoolExecutor:
+    """Thread pool for blocking file I/O."""
+    global _io_executor
+    if _io_executor is None:
+        _io_executor = ThreadPoolExecutor(
+            max_workers=settings.IO_EXECUTOR_MAX_WORKERS, thread_name_prefix="io"
+        )
+    return _io_executor
+
+
+async def run_cpu_bound(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """
+    Run func in the CPU executor without blocking the event loop. With the process
+    pool, func and its arguments must be picklable (module-level functions only).
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_cpu_executor(), functools.partial(func, *args, **kwargs)
+    )
+
+
+async def run_io_bound(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Run blocking file work in the I/O thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_io_executor(), functools.partial(func, *args, **kwargs)
+    )
+
+
+def shutdown_executors() -> None:
+    global _cpu_executor, _io_executor
+    if _cpu_executor is not None:
+        _cpu_executor.shutdown(wait=True, cancel_futures=True)
+        _cpu_executor = None
+    if _io_executor is not None:
+        _io_executor.shutdown(wait=True, cancel_futures=True)
+        _io_executor = None
@@ -0,0 +1,368 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Any, Optional
+import numpy as np
+from app.config import settings
+from app.database import SnapshotSessionLocal
+from app.repositories.rssi_value import RSSIValueRepository
+from app.services.encoder import BSSIDEncoder
+from app.services.executor import run_io_bound
+from app.services.export_formats import ExportFormat, open_writer
+from app.services.metrics import observe_stages
+
+# Sidecar next to each export file recording which data version it holds
+META_SUFFIX = ".meta.json"
+
+# Largest read when following a build in progress
+READ_CHUNK_BYTES = 1024 * 1024
+
+
+def _read_meta(path: str) -> Optional[dict]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _write_meta(path: str, meta: dict) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, path)
+
+
+def cached_export_path(output_dir: str, place_id: int, export_format: ExportFormat, version: int) -> str:
+    """
+    Cache file of one data version of a place's export. Each path is only ever
+    written with that version, so a reader never sees another version's bytes.
+    """
+    return os.path.join(output_dir, export_format.filename(f"{place_id}-v{version}"))
+
+
+def _remove_stale(export_path: str, place_id: int, export_format: ExportFormat, version: int) -> None:
+    """Remove the cached exports of older data versions of a place in this format."""
+    output_dir = os.path.dirname(export_path)
+    prefix = f"{place_id}-v"
+    suffix = export_format.filename(f"{prefix}0")[len(prefix) + 1:]
+    for name in os.listdir(output_dir):
+        if not (name.startswith(prefix) and name.endswith(suffix)):
+            continue
+        old_version = name[len(prefix):len(name) - len(suffix)]
+        if old_version.isdigit() and int(old_version) < version:
+            # Readers that already opened the file keep reading it
+            for path in (os.path.join(output_dir, name), os.path.join(output_dir, f"{name}{META_SUFFIX}")):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+
+def _flush(export_file, chunk: bytes) -> int:
+    """Flush a chunk the writer appended, so readers following the file see it."""
+    export_file.flush()
+    return len(chunk)
+
+
+class ExportBuild:
+    """
+    An export being written to a temporary file. Readers follow the file as it
+    grows and are woken whenever a chunk is appended or the build ends.
+    """
+
+    def __init__(self, tmp_path: str):
+        self.tmp_path = tmp_path
+        self.built_at = datetime.now(timezone.utc)
+        self.size = 0
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.changed = asyncio.Event()
+
+    def _notify(self) -> None:
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+    def advance(self, written: int) -> None:
+        self.size += written
+        self._notify()
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        self.done = True
+        self.error = error
+        self._notify()
+
+    async def wait(self) -> None:
+        """Wait until the build has completed or failed."""
+        while not self.done:
+            await self.changed.wait()
+
+
+class _DiscardFile:
+    """Export file stand-in for exports that are only streamed, never saved."""
+
+    def write(self, data) -> int:
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+
+async def _iter_chunks(
+    rssi_repo: RSSIValueRepository,
+    place_id: int,
+    export_format: ExportFormat,
+    version: int,
+    after_version: Optional[int],
+    after_sample_id: Optional[int],
+    since: Optional[datetime],
+    until: Optional[datetime],
+    bssids: Optional[list[str]] = None,
+):
+    """Chunks of samples (wide layout) or raw readings (long layout) up to a data version."""
+    if export_format.layout == "long":
+        async for readings in rssi_repo.stream_place_readings(
+            place_id,
+            chunk_size=settings.EXPORT_LONG_CHUNK_ROWS,
+            max_version=version,
+            after_version=after_version,
+            after_sample_id=after_sample_id,
+            since=since,
+            until=until,
+        ):
+            yield readings
+        return
+
+    samples = []
+    async for location_name, _, rssi_dict in rssi_repo.stream_place_samples(
+        place_id,
+        chunk_size=settings.EXPORT_CHUNK_ROWS,
+        max_version=version,
+        after_version=after_version,
+        after_sample_id=after_sample_id,
+        since=since,
+        until=until,
+        bssids=bssids,
+    ):
+        samples.append((location_name, rssi_dict))
+        if len(samples) >= settings.EXPORT_CHUNK_ROWS:
+            yield samples
+            samples = []
+    if samples:
+        yield samples
+
+
+async def render_export(
+    export_file,
+    place_id: int,
+    export_format: ExportFormat,
+    version: int,
+    after_version: Optional[int] = None,
+    after_sample_id: Optional[int] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+):
+    """
+    Write the export of a place up to a data version into export_file and yield
+    each chunk as it is written. Reads through its own session, from a single
+    snapshot so the header and both storage layouts agree; rendering and file
+    writes run in the I/O pool so the event loop stays free.
+    """
+    async with SnapshotSessionLocal() as session:
+        rssi_repo = RSSIValueRepository(session)
+        bssids, encoder = None, None
+        if export_format.layout == "wide":
+            # Sorted BSSIDs for consistent column order, the same column encoder
+            # the trained model and the predictor use
+            bssids = await rssi_repo.get_place_bssids(
+                place_id,
+                max_version=version,
+                after_version=after_version,
+                after_sample_id=after_sample_id,
+                since=since,
+                until=until,
+            )
+            encoder = BSSIDEncoder(bssids, dtype=np.int16)
+
+        writer = await run_io_bound(open_writer, export_file, export_format, encoder)
+        yield await run_io_bound(writer.header)
+        async for rows in _iter_chunks(
+            rssi_repo,
+            place_id,
+            export_format,
+            version,
+            after_version,
+            after_sample_id,
+            since,
+            until,
+            bssids,
+        ):
+            yield await run_io_bound(writer.write, rows)
+        yield await run_io_bound(writer.close)
+
+
+async def stream_delta(
+    place_id: int,
+    export_format: ExportFormat,
+    version: int,
+    after_version: Optional[int],
+    after_sample_id: Optional[int],
+    since: Optional[datetime],
+    until: Optional[datetime] = None,
+):
+    """
+    Stream an export of only the samples written after a data version, after a
+    sample ID and/or within a time window, without saving it.
+    """
+    async for chunk in render_export(
+        _DiscardFile(),
+        place_id,
+        export_format,
+        version,
+        after_version,
+        after_sample_id,
+        since,
+        until,
+    ):
+        if chunk:
+            yield chunk
+
+
+class ExportCache:
+    """
+    Reuses export files in the output directory, one per data version of their
+    place (Place.data_version, see export_path); older versions are removed once
+    a newer one is built. A missing version is built once in the background:
+    concurrent requests for it all stream the same temporary file while it is
+    written, and a client disconnecting does not stop the build.
+    """
+
+    def __init__(self):
+        self._builds: dict[tuple[int, ExportFormat, int], ExportBuild] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    async def open_cached(
+        self, export_path: str, place_id: int, export_format: ExportFormat, version: int
+    ) -> Optional[tuple[dict, Any]]:
+        """
+        Metadata and an open reader of the cached export if it holds this data
+        version, otherwise None. The file is opened first, so removing it once a
+        newer version is built does not affect the reader.
+        """
+        try:
+            reader = await run_io_bound(open, export_path, "rb")
+        except FileNotFoundError:
+            return None
+        meta = await run_io_bound(_read_meta, f"{export_path}{META_SUFFIX}")
+        if (
+            meta is None
+            or meta.get("place_id") != place_id
+            or meta.get("format") != export_format.value
+            or meta.get("data_version") != version
+        ):
+            reader.close()
+            return None
+        return meta, reader
+
+    async def read(self, reader):
+        """Stream a cached export from an open reader."""
+        try:
+            while chunk := await run_io_bound(reader.read, READ_CHUNK_BYTES):
+                yield chunk
+        finally:
+            reader.close()
+
+    def get_build(
+        self, export_path: str, place_id: int, export_format: ExportFormat, version: int
+    ) -> ExportBuild:
+        """Return the build in progress for this version, starting one if needed."""
+        key = (place_id, export_format, version)
+        build = self._builds.get(key)
+        if build is not None:
+            return build
+
+        build = ExportBuild(f"{export_path}.{uuid.uuid4().hex}.tmp")
+        # Created before any reader tries to open it
+        export_file = open(build.tmp_path, "wb")
+        self._builds[key] = build
+        task = asyncio.create_task(
+            self._build(build, key, export_path, export_file)
+        )
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return build
+
+    async def _build(self, build: ExportBuild, key: tuple, export_path: str, export_file) -> None:
+        place_id, export_format, version = key
+        started = time.perf_counter()
+        try:
+            async for chunk in render_export(export_file, place_id, export_format, version):
+                build.advance(await run_io_bound(_flush, export_file, chunk))
+
+            await run_io_bound(export_file.close)
+            await run_io_bound(os.replace, build.tmp_path, export_path)
+            await run_io_bound(
+                _write_meta,
+                f"{export_path}{META_SUFFIX}",
+                {
+                    "place_id": place_id,
+                    "format": export_format.value,
+                    "data_version": version,
+                    "built_at": build.built_at.isoformat(),
+                },
+            )
+        except asyncio.CancelledError as e:
+            build.finish(e)
+            raise
+        except Exception as e:
+            logging.error(f"Error building export for place {place_id}: {str(e)}")
+            build.finish(e)
+        else:
+            build.finish()
+            observe_stages("export", {"build": time.perf_counter() - started})
+            try:
+                await run_io_bound(_remove_stale, export_path, place_id, export_format, version)
+            except OSError as e:
+                logging.error(f"Error removing old exports of place {place_id}: {str(e)}")
+        finally:
+            self._builds.pop(key, None)
+            # Readers that still have the temporary file open keep reading it
+            export_file.close()
+            if os.path.exists(build.tmp_path):
+                os.remove(build.tmp_path)
+
+    async def follow(self, build: ExportBuild, reader):
+        """Stream a build from an open reader of its temporary file until it completes."""
+        try:
+            offset = 0
+            while True:
+                changed = build.changed
+                if offset < build.size:
+                    chunk = await run_io_bound(
+                        reader.read, min(READ_CHUNK_BYTES, build.size - offset)
+                    )
+                    if not chunk:
+                        raise RuntimeError(f"Export file {build.tmp_path} was truncated")
+                    offset += len(chunk)
+                    yield chunk
+                    continue
+                if build.done:
+                    if build.error is not None:
+                        # Ends the response early so the client sees a failed download
+                        raise RuntimeError(f"Export failed: {str(build.error) or type(build.error).__name__}")
+                    return
+                await changed.wait()
+        finally:
+            reader.close()
+
+    async def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+export_cache = ExportCache()
@@ -0,0 +1,217 @@
+import io
+import csv
+from enum import Enum
+import numpy as np
+import pandas as pd
+from app.services.encoder import BSSIDEncoder, MISSING_RSSI
+
+# Column order of the sparse "long" layout: one row per (sample, BSSID) reading
+LONG_COLUMNS = ["location", "sample_id", "timestamp", "bssid", "rssi"]
+
+
+class ExportFormat(str, Enum):
+    csv = "csv"  # wide: "location" + one RSSI column per BSSID
+    long_csv = "long-csv"
+    parquet = "parquet"
+    arrow = "arrow"  # Arrow IPC stream
+
+    @property
+    def layout(self) -> str:
+        return "wide" if self is ExportFormat.csv else "long"
+
+    @property
+    def media_type(self) -> str:
+        return {
+            ExportFormat.csv: "text/csv",
+            ExportFormat.long_csv: "text/csv",
+            ExportFormat.parquet: "application/vnd.apache.parquet",
+            ExportFormat.arrow: "application/vnd.apache.arrow.stream",
+        }[self]
+
+    def filename(self, place_name: str) -> str:
+        return {
+            ExportFormat.csv: f"{place_name}.csv",
+            ExportFormat.long_csv: f"{place_name}_long.csv",
+            ExportFormat.parquet: f"{place_name}.parquet",
+            ExportFormat.arrow: f"{place_name}.arrow",
+        }[self]
+
+
+class _CsvWriter:
+    def __init__(self, file):
+        self.file = file
+
+    def _write_rows(self, rows) -> bytes:
+        """Render rows as CSV, append them to the export file and return them."""
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        chunk = buffer.getvalue().encode()
+        self.file.write(chunk)
+        return chunk
+
+    def close(self) -> bytes:
+        return b""
+
+
+class WideCsvWriter(_CsvWriter):
+    """Whereami-compatible CSV: a "location" column plus one column per BSSID."""
+
+    def __init__(self, file, encoder: BSSIDEncoder):
+        super().__init__(file)
+        self.encoder = encoder
+
+    def header(self) -> bytes:
+        return self._write_rows([["location"] + self.encoder.bssids])
+
+    def write(self, samples: list[tuple[str, dict]]) -> bytes:
+        """Append (location, {bssid: rssi}) samples; missing BSSIDs are written as -100."""
+        matrix = self.encoder.encode_batch([rssi_dict for _, rssi_dict in samples])
+        return self._write_rows(
+            [location_name] + row
+            for (location_name, _), row in zip(samples, matrix.tolist())
+        )
+
+
+class LongCsvWriter(_CsvWriter):
+    """Sparse CSV with one (location, sample_id, timestamp, bssid, rssi) row per reading."""
+
+    def header(self) -> bytes:
+        return self._write_rows([LONG_COLUMNS])
+
+    def write(self, readings: list[tuple]) -> bytes:
+        return self._write_rows(
+            (location, sample_id, timestamp.isoformat() if timestamp else "", bssid, rssi)
+            for location, sample_id, timestamp, bssid, rssi in readings
+        )
+
+
+class _TeeSink:
+    """
+    Writable file object for pyarrow that writes through to the export file and
+    keeps the bytes written since the last drain(), so they can be streamed.
+    """
+
+    def __init__(self, file):
+        self.file = file
+        self.buffer = bytearray()
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        self.file.write(data)
+        self.buffer += data
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self) -> None:
+        self.file.flush()
+
+    def close(self) -> None:
+        # The export file itself is closed by the caller
+        self.closed = True
+
+    def drain(self) -> bytes:
+        chunk = bytes(self.buffer)
+        self.buffer.clear()
+        return chunk
+
+
+class ArrowWriter:
+    """
+    Long layout as zstd-compressed Parquet (one row group per chunk) or as an
+    Arrow IPC stream (one record batch per chunk). pyarrow is imported lazily,
+    so it is only needed for these formats.
+    """
+
+    def __init__(self, file, export_format: ExportFormat):
+        import pyarrow as pa
+        import pyarrow.ipc
+        import pyarrow.parquet
+
+        self.sink = _TeeSink(file)
+        self.schema = pa.schema(
+            [
+                ("location", pa.string()),
+                ("sample_id", pa.int32()),
+                ("timestamp", pa.timestamp("us", tz="UTC")),
+                ("bssid", pa.string()),
+                ("rssi", pa.int16()),
+            ]
+        )
+        output = pa.PythonFile(self.sink, mode="w")
+        if export_format is ExportFormat.parquet:
+            self.writer = pyarrow.parquet.ParquetWriter(
+                output, self.schema, compression="zstd"
+            )
+        else:
+            self.writer = pyarrow.ipc.new_stream(
+                output,
+                self.schema,
+                options=pyarrow.ipc.IpcWriteOptions(compression="zstd"),
+            )
+
+    def header(self) -> bytes:
+        return self.sink.drain()
+
+    def write(self, readings: list[tuple]) -> bytes:
+        import pyarrow as pa
+
+        columns = zip(*readings)
+        self.writer.write_table(
+            pa.Table.from_arrays(
+                [pa.array(column, type=field.type) for column, field in zip(columns, self.schema)],
+                schema=self.schema,
+            )
+        )
+        return self.sink.drain()
+
+    def close(self) -> bytes:
+        self.writer.close()
+        return self.sink.drain()
+
+
+def open_writer(file, export_format: ExportFormat, encoder: BSSIDEncoder = None):
+    """Writer for an export format, writing into an open binary file."""
+    if export_format is ExportFormat.csv:
+        return WideCsvWriter(file, encoder)
+    if export_format is ExportFormat.long_csv:
+        return LongCsvWriter(file)
+    return ArrowWriter(file, export_format)
+
+
+def _long_to_wide(df: pd.DataFrame) -> tuple[BSSIDEncoder, np.ndarray, np.ndarray]:
+    sample_codes, sample_ids = pd.factorize(df["sample_id"], sort=True)
+    bssid_codes, bssids = pd.factorize(df["bssid"].astype(str), sort=True)
+    X = np.full((len(sample_ids), len(bssids)), MISSING_RSSI, dtype=np.float32)
+    X[sample_codes, bssid_codes] = df["rssi"].to_numpy(dtype=np.float32)
+    y = np.empty(len(sample_ids), dtype=object)
+    y[sample_codes] = df["location"].astype(str).to_numpy()
+    return BSSIDEncoder(list(bssids)), X, y.astype(str)
+
+
+def read_export(path: str) -> tuple[BSSIDEncoder, np.ndarray, np.ndarray]:
+    """
+    Load an export file of any format as (encoder, X, y): one float32 row per
+    sample in the encoder's column order, and the location labels.
+    """
+    if path.endswith(".parquet"):
+        df = pd.read_parquet(path)
+    elif path.endswith(".arrow"):
+        import pyarrow.ipc
+
+        with pyarrow.ipc.open_stream(path) as reader:
+            df = reader.read_pandas()
+    else:
+        df = pd.read_csv(path)
+
+    if "bssid" in df.columns:
+        return _long_to_wide(df)
+
+    # The wide header is "location" + the BSSID columns, in the encoder's order
+    encoder = BSSIDEncoder(df.columns[1:])
+    X = df[encoder.bssids].to_numpy(dtype=np.float32)
+    y = df["location"].astype(str).to_numpy()
+    return encoder, X, y
@@ -0,0 +1,78 @@
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+from app.config import settings
+
+HierarchyKey = tuple[str, str, str]  # (username, place, location)
+HierarchyIds = tuple[int, int, int]  # (user_id, place_id, location_id)
+
+
+class HierarchyCache:
+    """
+    In-process TTL + LRU cache of resolved (username, place, location) ->
+    (user_id, place_id, location_id), so repeat uploads to the same location skip
+    the hierarchy lookup. A TTL of 0 disables the cache.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[HierarchyKey, tuple[HierarchyIds, float]] = OrderedDict()
+
+    def get(self, key: HierarchyKey) -> Optional[HierarchyIds]:
+        entry = self._entries.get(key)
+        if entry is None or entry[1] <= time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def set(self, key: HierarchyKey, ids: HierarchyIds) -> None:
+        if self.ttl <= 0 or self.max_size <= 0:
+            return
+        self._entries[key] = (ids, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate_where(
+        self, predicate: Callable[[HierarchyKey, HierarchyIds], bool]
+    ) -> int:
+        """Drop every entry matching predicate(key, ids); returns how many were dropped."""
+        stale = [key for key, (ids, _) in self._entries.items() if predicate(key, ids)]
+        for key in stale:
+            del self._entries[key]
+        return len(stale)
+
+    def invalidate(
+        self,
+        user_id: Optional[int] = None,
+        place_id: Optional[int] = None,
+        location_id: Optional[int] = None,
+    ) -> int:
+        """Drop entries that point at the given user, place or location."""
+        return self.invalidate_where(
+            lambda _, ids: ids[0] == user_id or ids[1] == place_id or ids[2] == location_id
+        )
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+hierarchy_cache = HierarchyCache(
+    max_size=settings.HIERARCHY_CACHE_SIZE, ttl=settings.HIERARCHY_CACHE_TTL
+)
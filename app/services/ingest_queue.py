@@ -0,0 +1,241 @@
+import os
+import uuid
+import asyncio
+import logging
+from typing import Optional
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.repositories.fingerprint_stat import FingerprintStatRepository
+from app.repositories.hierarchy import HierarchyRepository
+from app.repositories.sample import SampleRepository
+from app.schemas.collect import CollectData
+from app.services.executor import run_io_bound
+from app.services.hierarchy_cache import hierarchy_cache
+
+
+class QueueFull(Exception):
+    """Raised when the ingestion queue cannot accept more uploads."""
+
+
+def _write_journal_entry(path: str, payload: str) -> None:
+    """
+    Write an entry durably: the upload is acknowledged once this returns, so the
+    file and its rename are both synced before that, surviving a host crash.
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    dir_fd = os.open(os.path.dirname(path), os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+def _remove_journal_entry(path: str) -> None:
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def _read_journal_entry(path: str) -> str:
+    with open(path) as f:
+        return f.read()
+
+
+def _claim_journal_entries(journal_dir: str) -> list[tuple[str, str]]:
+    """Claim leftover entries for replay; returns (receipt_id, path) pairs."""
+    claimed = []
+    for name in sorted(os.listdir(journal_dir)):
+        path = os.path.join(journal_dir, name)
+        if name.endswith(".json.replay"):
+            # Claimed by an earlier replay that did not finish; possibly still in
+            # progress in another worker process, so it is not picked up again
+            logging.warning(f"Skipping journal entry {path}, rename it to *.json to replay it")
+        elif name.endswith(".json"):
+            replay_path = f"{path}.replay"
+            try:
+                # Another worker process may claim the same entry first
+                os.rename(path, replay_path)
+            except FileNotFoundError:
+                continue
+            claimed.append((name.removesuffix(".json"), replay_path))
+    return claimed
+
+
+class IngestQueue:
+    """
+    Bounded in-process queue for write-behind ingestion. Accepted uploads are
+    drained by background writers that merge up to `batch_size` uploads into one
+    transaction with a single multi-row insert. With a journal directory, every
+    accepted upload is also written to disk until it is committed and replayed on
+    the next startup if the process stops first.
+    """
+
+    def __init__(
+        self, max_size: int, batch_size: int, workers: int, journal_dir: Optional[str]
+    ):
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.workers = workers
+        self.journal_dir = journal_dir
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_size)
+        self._tasks: list[asyncio.Task] = []
+        self.accepted = 0
+        self.rejected = 0
+        self.written_uploads = 0
+        self.written_samples = 0
+        self.failed_uploads = 0
+        self.batches = 0
+
+    def _journal_path(self, receipt_id: str) -> Optional[str]:
+        if not self.journal_dir:
+            return None
+        return os.path.join(self.journal_dir, f"{receipt_id}.json")
+
+    async def start(self) -> None:
+        for _ in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._run()))
+
+        if self.journal_dir:
+            await run_io_bound(os.makedirs, self.journal_dir, exist_ok=True)
+            entries = await run_io_bound(_claim_journal_entries, self.journal_dir)
+            for receipt_id, path in entries:
+                payload = await run_io_bound(_read_journal_entry, path)
+                try:
+                    data = CollectData.model_validate_json(payload)
+                except ValueError as e:
+                    logging.error(f"Dropping unreadable journal entry {path}: {str(e)}")
+                    await run_io_bound(os.replace, path, f"{path}.failed")
+                    continue
+                # Waits for free space instead of rejecting replayed uploads
+                await self._queue.put((receipt_id, data, path))
+            if entries:
+                logging.info(f"Replaying {len(entries)} journaled uploads")
+
+    async def submit(self, data: CollectData) -> str:
+        """Queue an upload and return its receipt ID, or raise QueueFull."""
+        if self._queue.full():
+            self.rejected += 1
+            raise QueueFull()
+
+        receipt_id = uuid.uuid4().hex
+        path = self._journal_path(receipt_id)
+        if path is not None:
+            await run_io_bound(_write_journal_entry, path, data.model_dump_json())
+
+        try:
+            self._queue.put_nowait((receipt_id, data, path))
+        except asyncio.QueueFull:
+            # Filled up while the journal entry was being written
+            if path is not None:
+                await run_io_bound(_remove_journal_entry, path)
+            self.rejected += 1
+            raise QueueFull()
+
+        self.accepted += 1
+        return receipt_id
+
+    async def _run(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            try:
+                try:
+                    await self._write(batch)
+                except Exception as e:
+                    if len(batch) == 1:
+                        raise
+                    # Retry one by one so a bad upload does not sink the whole batch
+                    logging.warning(f"Merged ingest batch failed, retrying uploads one by one: {str(e)}")
+                    for item in batch:
+                        try:
+                            await self._write([item])
+                        except Exception as item_error:
+                            await self._fail(item, item_error)
+            except Exception as e:
+                await self._fail(batch[0], e)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _write(self, batch: list) -> None:
+        resolved = {}
+        async with AsyncSessionLocal() as session:
+            async with session.begin():
+                hierarchy_repo = HierarchyRepository(session)
+                samples = []
+                for _, data, _ in batch:
+                    key = (data.username, data.place, data.location)
+                    if key not in resolved:
+                        ids = hierarchy_cache.get(key)
+                        if ids is None:
+                            ids = await hierarchy_repo.resolve(*key)
+                        resolved[key] = ids
+                    location_id = resolved[key][2]
+                    samples.extend((location_id, sample) for sample in data.samples)
+
+                if settings.FINGERPRINT_STATS:
+                    await FingerprintStatRepository(session).record_samples(samples)
+                # Last, as it locks the places until the commit
+                await SampleRepository(session).bulk_create_samples(
+                    samples, packed=settings.RSSI_STORAGE == "packed"
+                )
+
+        for key, ids in resolved.items():
+            hierarchy_cache.set(key, ids)
+        for _, _, path in batch:
+            if path is not None:
+                await run_io_bound(_remove_journal_entry, path)
+
+        self.batches += 1
+        self.written_uploads += len(batch)
+        self.written_samples += len(samples)
+
+    async def _fail(self, item: tuple, error: Exception) -> None:
+        receipt_id, data, path = item
+        self.failed_uploads += 1
+        logging.error(f"Ingestion of upload {receipt_id} failed: {str(error)}")
+        # The cached IDs may be stale (e.g. the location was deleted)
+        key = (data.username, data.place, data.location)
+        hierarchy_cache.invalidate_where(lambda cached_key, _: cached_key == key)
+        if path is not None:
+            # Kept for inspection but never replayed
+            await run_io_bound(os.replace, path, f"{path}.failed")
+
+    async def stop(self, timeout: float) -> None:
+        """Give the writers up to `timeout` seconds to drain the queue, then stop them."""
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logging.warning(
+                f"Stopping ingestion with {self._queue.qsize()} uploads still queued"
+            )
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    def stats(self) -> dict:
+        return {
+            "depth": self._queue.qsize(),
+            "max_size": self.max_size,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "written_uploads": self.written_uploads,
+            "written_samples": self.written_samples,
+            "failed_uploads": self.failed_uploads,
+            "batches": self.batches,
+        }
+
+
+ingest_queue = IngestQueue(
+    max_size=settings.INGEST_QUEUE_SIZE,
+    batch_size=settings.INGEST_BATCH_SIZE,
+    workers=settings.INGEST_WORKERS,
+    journal_dir=settings.INGEST_JOURNAL_DIR or None,
+)
@@ -0,0 +1,114 @@
+import time
+from typing import Callable
+from prometheus_client import REGISTRY, Counter, Gauge, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+# Seconds spent in each stage of a hot path, e.g. ("collect", "hierarchy")
+STAGE_SECONDS = Histogram(
+    "dishasarthi_stage_seconds",
+    "Time spent per stage of the collect, export and predict paths",
+    ["endpoint", "stage"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "dishasarthi_http_request_seconds",
+    "HTTP request duration until the response body is sent, by handler and status",
+    ["handler", "status"],
+)
+
+WEBSOCKET_CONNECTIONS = Gauge(
+    "dishasarthi_websocket_connections",
+    "Open prediction WebSocket connections",
+    ["protocol"],
+)
+
+PREDICTIONS = Counter(
+    "dishasarthi_predictions",
+    "Scans answered, by place and protocol (json, the negotiated subprotocol or batch)",
+    ["place_id", "protocol"],
+)
+
+PREDICTIONS_GATED = Counter(
+    "dishasarthi_predictions_gated",
+    "WebSocket scans answered from the previous result by delta gating",
+    ["place_id"],
+)
+
+PREDICT_BATCH_SIZE = Histogram(
+    "dishasarthi_predict_batch_size",
+    "Scans per model call of the WebSocket micro-batcher",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+
+
+def stage(endpoint: str, name: str):
+    """Context manager timing one stage into STAGE_SECONDS."""
+    return STAGE_SECONDS.labels(endpoint, name).time()
+
+
+def observe_stages(endpoint: str, timings: dict[str, float]) -> None:
+    for name, seconds in timings.items():
+        STAGE_SECONDS.labels(endpoint, name).observe(seconds)
+
+
+class StatsCollector:
+    """
+    Exposes the stats() dicts the service already keeps (pool, caches, queues) at
+    scrape time, so they cost nothing on the hot paths. Keys listed as counters
+    become Prometheus counters, the rest gauges.
+    """
+
+    def __init__(self):
+        self._sources: list[tuple[str, Callable[[], dict], set[str]]] = []
+
+    def add(self, name: str, stats: Callable[[], dict], counters: set[str] = frozenset()) -> None:
+        self._sources.append((name, stats, set(counters)))
+
+    def collect(self):
+        for name, stats, counters in self._sources:
+            for key, value in stats().items():
+                if not isinstance(value, (int, float)) or isinstance(value, bool):
+                    continue
+                metric = f"dishasarthi_{name}_{key}"
+                if key in counters:
+                    yield CounterMetricFamily(metric.removesuffix("_total"), f"{name} {key}", value=value)
+                else:
+                    yield GaugeMetricFamily(metric, f"{name} {key}", value=value)
+
+
+stats_collector = StatsCollector()
+REGISTRY.register(stats_collector)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording HTTP_REQUEST_SECONDS. The handler label is the name
+    of the endpoint function the router matched ("unmatched" for 404s), so the
+    label set stays bounded whatever the path parameters.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            endpoint = scope.get("endpoint")
+            HTTP_REQUEST_SECONDS.labels(
+                getattr(endpoint, "__name__", "unmatched"), str(status_code)
+            ).observe(time.perf_counter() - start)
@@ -0,0 +1,128 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from whereami.utils import get_model_file
+from app.config import settings
+from app.services.encoder import BSSIDEncoder
+from app.services.predictors import Predictor, engine_for_place, load_predictor
+
+# Define the directory where trained models are stored
+TRAINED_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "trained"
+)
+
+
+@dataclass
+class LoadedModel:
+    model: Predictor
+    encoder: BSSIDEncoder
+
+    @property
+    def classes(self) -> list[str]:
+        return self.model.classes
+
+
+@dataclass
+class _CachedModel:
+    model: LoadedModel
+    signature: tuple[int, int]
+    checked_at: float
+
+
+def load_model(model_dir: str, engine: str = "forest") -> LoadedModel:
+    """Load a place's predictor together with the BSSID vocabulary it was trained on."""
+    # Resolved once: publish_model swaps the symlink to a new version directory
+    model_dir = os.path.realpath(model_dir)
+    encoder = BSSIDEncoder.load(model_dir)
+    model = load_predictor(model_dir, engine)
+    n_features = model.n_features if model.n_features is not None else len(encoder)
+    if n_features != len(encoder):
+        raise ValueError(
+            f"Model in {model_dir} expects {n_features} features but its vocabulary has {len(encoder)} BSSIDs"
+        )
+    return LoadedModel(model, encoder)
+
+
+class ModelRegistry:
+    """
+    In-process LRU cache of trained models keyed by place ID.
+
+    A model and its BSSID vocabulary are loaded once and reused until the model
+    file changes on disk (detected through mtime and size), at which point both are
+    reloaded and swapped in as a whole. If the reload fails, the previous model
+    keeps serving.
+    """
+
+    def __init__(self, max_size: int, check_interval: float):
+        self.max_size = max_size
+        self.check_interval = check_interval
+        self._models: OrderedDict[int, _CachedModel] = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks: dict[int, threading.Lock] = {}
+
+    @staticmethod
+    def model_dir(place_id: int) -> str:
+        return os.path.join(TRAINED_DIR, str(place_id))
+
+    def _signature(self, place_id: int) -> tuple[int, int]:
+        stat = os.stat(get_model_file(self.model_dir(place_id)))
+        return stat.st_mtime_ns, stat.st_size
+
+    def get(self, place_id: int) -> LoadedModel:
+        """Return the model for a place, loading or reloading it if needed."""
+        now = time.monotonic()
+        with self._lock:
+            cached = self._models.get(place_id)
+            if cached is not None:
+                self._models.move_to_end(place_id)
+                if now - cached.checked_at < self.check_interval:
+                    return cached.model
+            load_lock = self._load_locks.setdefault(place_id, threading.Lock())
+
+        with load_lock:
+            try:
+                signature = self._signature(place_id)
+            except FileNotFoundError:
+                self.evict(place_id)
+                raise
+
+            # Another thread may have reloaded the model while we waited
+            with self._lock:
+                cached = self._models.get(place_id, cached)
+            if cached is not None and cached.signature == signature:
+                cached.checked_at = now
+                return cached.model
+
+            try:
+                model = load_model(self.model_dir(place_id), engine_for_place(place_id))
+            except Exception as e:
+                if cached is None:
+                    raise
+                logging.warning(
+                    f"Reloading model for place {place_id} failed, keeping previous model: {str(e)}"
+                )
+                cached.checked_at = now
+                return cached.model
+
+            with self._lock:
+                self._models[place_id] = _CachedModel(model, signature, now)
+                self._models.move_to_end(place_id)
+                while len(self._models) > self.max_size:
+                    self._models.popitem(last=False)
+
+            if cached is not None:
+                logging.info(f"Reloaded model for place {place_id}")
+            return model
+
+    def evict(self, place_id: int) -> None:
+        with self._lock:
+            self._models.pop(place_id, None)
+
+
+model_registry = ModelRegistry(
+    max_size=settings.MODEL_CACHE_SIZE,
+    check_interval=settings.MODEL_CACHE_CHECK_INTERVAL,
+)
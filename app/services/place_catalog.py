@@ -0,0 +1,147 @@
+import os
+import asyncio
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+from sqlalchemy import select
+from whereami.utils import get_model_file
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.models.place import Place
+from app.services.encoder import BSSIDEncoder
+from app.services.executor import run_io_bound
+from app.services.model_registry import ModelRegistry
+
+
+@dataclass
+class CatalogEntry:
+    place_id: int
+    name: Optional[str]  # None: no such place
+    model_signature: Optional[tuple[int, int]]  # (mtime_ns, size) of model.pkl, None: not trained
+    vocabulary: Optional[list[str]] = None  # loaded on first use by a compact client
+
+    @property
+    def exists(self) -> bool:
+        return self.name is not None
+
+    @property
+    def has_model(self) -> bool:
+        return self.model_signature is not None
+
+
+def _model_signatures(place_ids: list[int]) -> dict[int, Optional[tuple[int, int]]]:
+    signatures = {}
+    for place_id in place_ids:
+        try:
+            stat = os.stat(get_model_file(ModelRegistry.model_dir(place_id)))
+            signatures[place_id] = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            signatures[place_id] = None
+    return signatures
+
+
+class PlaceCatalog:
+    """
+    In-process LRU catalog of place names and trained-model state, so WebSocket
+    connects are validated without a database session. A miss is loaded through a
+    short-lived session (once, however many connects are waiting for it). Known
+    entries, including places that do not exist, are refreshed in one query every
+    PLACE_CATALOG_REFRESH_INTERVAL seconds and right after a model is published.
+    """
+
+    def __init__(self, max_size: int, refresh_interval: float):
+        self.max_size = max_size
+        self.refresh_interval = refresh_interval
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self._entries: OrderedDict[int, CatalogEntry] = OrderedDict()
+        self._loading: dict[int, asyncio.Future] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if self.refresh_interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logging.error(f"Error refreshing the place catalog: {str(e)}")
+
+    async def get(self, place_id: int) -> CatalogEntry:
+        entry = self._entries.get(place_id)
+        if entry is not None:
+            self._entries.move_to_end(place_id)
+            self.hits += 1
+            return entry
+        self.misses += 1
+
+        loading = self._loading.get(place_id)
+        if loading is None:
+            loading = asyncio.ensure_future(self.refresh([place_id]))
+            self._loading[place_id] = loading
+            loading.add_done_callback(lambda _: self._loading.pop(place_id, None))
+        # A connect giving up must not cancel the load for the others
+        await asyncio.shield(loading)
+        return self._entries.get(place_id) or CatalogEntry(place_id, None, None)
+
+    async def vocabulary(self, entry: CatalogEntry) -> list[str]:
+        """The BSSID vocabulary of the place's model; raises FileNotFoundError or ValueError if it has none."""
+        if entry.vocabulary is None:
+            encoder = await run_io_bound(
+                BSSIDEncoder.load, ModelRegistry.model_dir(entry.place_id)
+            )
+            entry.vocabulary = encoder.bssids
+        return entry.vocabulary
+
+    async def refresh(self, place_ids: Optional[list[int]] = None) -> None:
+        """Reload the given places (every known one by default) from the database and disk."""
+        if place_ids is None:
+            place_ids = list(self._entries)
+        if not place_ids:
+            return
+
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(Place.id, Place.name).where(Place.id.in_(place_ids))
+            )
+            names = dict(result.all())
+        signatures = await run_io_bound(_model_signatures, place_ids)
+        self.refreshes += 1
+
+        for place_id in place_ids:
+            previous = self._entries.get(place_id)
+            entry = CatalogEntry(place_id, names.get(place_id), signatures[place_id])
+            if previous is not None and previous.model_signature == entry.model_signature:
+                # The vocabulary is published together with the model file
+                entry.vocabulary = previous.vocabulary
+            self._entries[place_id] = entry
+            self._entries.move_to_end(place_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "refresh_interval_seconds": self.refresh_interval,
+            "hits": self.hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+        }
+
+
+place_catalog = PlaceCatalog(
+    max_size=settings.PLACE_CATALOG_SIZE,
+    refresh_interval=settings.PLACE_CATALOG_REFRESH_INTERVAL,
+)
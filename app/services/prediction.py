@@ -0,0 +1,71 @@
+import time
+import numpy as np
+from app.services.model_registry import model_registry
+
+
+def predict_place_batch_timed(
+    place_id: int, scans: list[dict[str, int]]
+) -> tuple[list[list[tuple[str, float]]], dict[str, float]]:
+    """
+    predict_place_batch, plus the seconds spent loading the model, encoding the
+    scans and in predict_proba. Returned rather than recorded here, so the timings
+    also reach the metrics when it runs in a worker process.
+    """
+    start = time.perf_counter()
+    loaded = model_registry.get(place_id)
+    loaded_at = time.perf_counter()
+    # Encode all scans into one matrix using the vocabulary the model was trained on
+    matrix = loaded.encoder.encode_batch(scans)
+    encoded_at = time.perf_counter()
+    probabilities = loaded.model.predict_proba(matrix)
+    scored_at = time.perf_counter()
+    classes = loaded.classes
+    results = [
+        [(location, float(probability)) for location, probability in zip(classes, row)]
+        for row in probabilities
+    ]
+    return results, {
+        "load": loaded_at - start,
+        "encode": encoded_at - loaded_at,
+        "model": scored_at - encoded_at,
+    }
+
+
+def predict_place_batch(
+    place_id: int, scans: list[dict[str, int]]
+) -> list[list[tuple[str, float]]]:
+    """
+    Score a batch of scans with the cached model of a place in one predict_proba call
+    and return (location, probability) pairs per scan. Blocking; call it through
+    app.services.executor.run_cpu_bound.
+    """
+    return predict_place_batch_timed(place_id, scans)[0]
+
+
+def _top_predictions(classes: list[str], probabilities: np.ndarray) -> list[tuple[str, float]]:
+    best = probabilities.argmax(axis=1)
+    return [
+        (classes[column], float(confidence))
+        for column, confidence in zip(best, probabilities[np.arange(len(best)), best])
+    ]
+
+
+def predict_place_top(place_id: int, scans: list[dict[str, int]]) -> list[tuple[str, float]]:
+    """Like predict_place_batch, but only the most likely location per scan."""
+    loaded = model_registry.get(place_id)
+    probabilities = loaded.model.predict_proba(loaded.encoder.encode_batch(scans))
+    return _top_predictions(loaded.classes, probabilities)
+
+
+def predict_place_rows(
+    place_id: int, columns: list[str], rows: list[list[str]]
+) -> list[tuple[str, float]]:
+    """
+    Most likely location for each row of a wide CSV (one RSSI column per BSSID, as
+    written by the export). Columns are mapped onto the model's vocabulary as a
+    whole matrix.
+    """
+    loaded = model_registry.get(place_id)
+    matrix = loaded.encoder.encode_dense(columns, np.asarray(rows, dtype=np.float32))
+    probabilities = loaded.model.predict_proba(matrix)
+    return _top_predictions(loaded.classes, probabilities)
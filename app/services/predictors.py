@@ -0,0 +1,155 @@
+import os
+import logging
+from typing import Protocol
+import numpy as np
+from whereami.pipeline import get_model
+from app.config import settings
+
+# Training fingerprints saved next to the model in trained/<place_id>/
+FINGERPRINTS_FILE = "fingerprints.npz"
+
+ENGINES = ("forest", "knn", "centroid")
+
+# Upper bound on the (scans x fingerprints) distance matrix computed at once
+_DISTANCE_BLOCK_ELEMENTS = 4_000_000
+
+
+class Predictor(Protocol):
+    """Scores encoded scans (rows in the vocabulary's column order) against locations."""
+
+    classes: list[str]
+    n_features: int
+
+    def predict_proba(self, matrix: np.ndarray) -> np.ndarray:
+        """Return an (n_scans, len(classes)) matrix of location probabilities."""
+        ...
+
+
+class ForestPredictor:
+    """The random forest trained by whereami's pipeline, loaded from model.pkl."""
+
+    def __init__(self, model):
+        self.model = model
+        self.classes = [str(location) for location in model.classes_]
+        self.n_features = getattr(model, "n_features_in_", None)
+
+    def predict_proba(self, matrix: np.ndarray) -> np.ndarray:
+        return self.model.predict_proba(matrix)
+
+
+def _squared_distances(matrix: np.ndarray, points: np.ndarray, point_norms: np.ndarray) -> np.ndarray:
+    """(n_scans, n_points) squared Euclidean distances via one matrix product."""
+    distances = point_norms[np.newaxis, :] - 2.0 * (matrix @ points.T)
+    distances += np.einsum("ij,ij->i", matrix, matrix)[:, np.newaxis]
+    np.maximum(distances, 0.0, out=distances)
+    return distances
+
+
+class KNNPredictor:
+    """
+    Distance-weighted k-nearest-fingerprint vote over the training scans, kept as
+    one contiguous float32 matrix.
+    """
+
+    def __init__(self, fingerprints: np.ndarray, labels: np.ndarray, k: int):
+        self.fingerprints = np.ascontiguousarray(fingerprints, dtype=np.float32)
+        self.norms = np.einsum("ij,ij->i", self.fingerprints, self.fingerprints)
+        classes, self.label_index = np.unique(labels.astype(str), return_inverse=True)
+        self.classes = classes.tolist()
+        self.n_features = self.fingerprints.shape[1]
+        self.k = max(1, min(k, len(self.fingerprints)))
+
+    def predict_proba(self, matrix: np.ndarray) -> np.ndarray:
+        matrix = np.asarray(matrix, dtype=np.float32)
+        probabilities = np.zeros((len(matrix), len(self.classes)), dtype=np.float64)
+        block = max(1, _DISTANCE_BLOCK_ELEMENTS // max(1, len(self.fingerprints)))
+        for start in range(0, len(matrix), block):
+            rows = matrix[start : start + block]
+            distances = _squared_distances(rows, self.fingerprints, self.norms)
+            if self.k < distances.shape[1]:
+                nearest = np.argpartition(distances, self.k - 1, axis=1)[:, : self.k]
+            else:
+                nearest = np.broadcast_to(np.arange(distances.shape[1]), distances.shape)
+            weights = 1.0 / (np.sqrt(np.take_along_axis(distances, nearest, axis=1)) + 1e-6)
+            votes = probabilities[start : start + len(rows)]
+            np.add.at(
+                votes,
+                (np.arange(len(rows))[:, np.newaxis], self.label_index[nearest]),
+                weights,
+            )
+        probabilities /= probabilities.sum(axis=1, keepdims=True)
+        return probabilities
+
+
+class CentroidPredictor:
+    """
+    Nearest location centroid (mean fingerprint per location). Probabilities come
+    from an isotropic Gaussian around each centroid, with the per-BSSID variance
+    of the training scans around their own centroid.
+    """
+
+    def __init__(self, fingerprints: np.ndarray, labels: np.ndarray):
+        fingerprints = np.asarray(fingerprints, dtype=np.float32)
+        classes, label_index = np.unique(labels.astype(str), return_inverse=True)
+        self.classes = classes.tolist()
+        self.n_features = fingerprints.shape[1]
+        sums = np.zeros((len(classes), fingerprints.shape[1]), dtype=np.float64)
+        np.add.at(sums, label_index, fingerprints)
+        counts = np.bincount(label_index, minlength=len(classes))[:, np.newaxis]
+        self.centroids = np.ascontiguousarray(sums / counts, dtype=np.float32)
+        self.norms = np.einsum("ij,ij->i", self.centroids, self.centroids)
+        variance = float(((fingerprints - self.centroids[label_index]) ** 2).mean())
+        self.variance = variance if variance > 0 else 1.0
+
+    def predict_proba(self, matrix: np.ndarray) -> np.ndarray:
+        distances = _squared_distances(
+            np.asarray(matrix, dtype=np.float32), self.centroids, self.norms
+        ).astype(np.float64)
+        logits = (distances.min(axis=1, keepdims=True) - distances) / (2.0 * self.variance)
+        weights = np.exp(logits)
+        return weights / weights.sum(axis=1, keepdims=True)
+
+
+def save_fingerprints(model_dir: str, X: np.ndarray, y: np.ndarray) -> None:
+    """Write the training matrix and labels to model_dir, replacing any previous ones atomically."""
+    path = os.path.join(model_dir, FINGERPRINTS_FILE)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, X=np.asarray(X, dtype=np.float32), y=np.asarray(y).astype(str))
+    os.replace(tmp_path, path)
+
+
+def load_fingerprints(model_dir: str) -> tuple[np.ndarray, np.ndarray]:
+    with np.load(os.path.join(model_dir, FINGERPRINTS_FILE), allow_pickle=False) as data:
+        return data["X"], data["y"]
+
+
+def engine_for_place(place_id: int) -> str:
+    """
+    Engine configured for a place: PREDICTOR_ENGINE, unless PREDICTOR_ENGINE_OVERRIDES
+    (e.g. "3:knn,7:centroid") names one for this place ID.
+    """
+    for override in settings.PREDICTOR_ENGINE_OVERRIDES.split(","):
+        place, _, engine = override.partition(":")
+        if place.strip() == str(place_id) and engine.strip():
+            return engine.strip()
+    return settings.PREDICTOR_ENGINE
+
+
+def load_predictor(model_dir: str, engine: str) -> Predictor:
+    """Load the given engine from a place's model directory."""
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown predictor engine {engine!r}, expected one of {ENGINES}")
+
+    if engine != "forest":
+        if os.path.exists(os.path.join(model_dir, FINGERPRINTS_FILE)):
+            X, y = load_fingerprints(model_dir)
+            if engine == "knn":
+                return KNNPredictor(X, y, settings.KNN_NEIGHBORS)
+            return CentroidPredictor(X, y)
+        # Models trained before fingerprints were saved alongside them
+        logging.warning(
+            f"No {FINGERPRINTS_FILE} in {model_dir}, using the forest engine instead of {engine}; retrain to switch"
+        )
+
+    return ForestPredictor(get_model(model_dir))
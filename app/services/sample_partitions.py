@@ -0,0 +1,375 @@
+import re
+import time
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from sqlalchemy import text
+from app.config import settings
+from app.database import engine
+
+# Arbitrary key for the advisory lock that lets one worker at a time run maintenance
+MAINTENANCE_LOCK_KEY = 7270156
+
+# Samples deleted per transaction when old rows are removed one by one
+RETENTION_BATCH_SIZE = 5000
+
+_RANGE_BOUND = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+_BEFORE_BOUND = re.compile(r"FROM \(MINVALUE\) TO \('([^']+)'\)")
+
+
+def add_months(value: datetime, months: int) -> datetime:
+    index = value.year * 12 + value.month - 1 + months
+    return value.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_start(value: datetime, months: int) -> datetime:
+    """Start of the partition holding a timestamp: midnight UTC on the first of a month."""
+    value = value.astimezone(timezone.utc)
+    index = (value.year * 12 + value.month - 1) // months * months
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def partition_name(start: datetime) -> str:
+    return f"samples_p{start:%Y_%m}"
+
+
+def before_partition_name(end: datetime) -> str:
+    return f"samples_before_p{end:%Y_%m}"
+
+
+async def is_partitioned(conn) -> bool:
+    result = await conn.execute(
+        text("SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'samples'::regclass)")
+    )
+    return bool(result.scalar())
+
+
+async def has_default_partition(conn) -> bool:
+    """Whether samples has a DEFAULT partition, which rules out detaching partitions concurrently."""
+    result = await conn.execute(
+        text("SELECT partdefid <> 0 FROM pg_partitioned_table WHERE partrelid = 'samples'::regclass")
+    )
+    return bool(result.scalar())
+
+
+async def _child_bounds(conn) -> list[tuple[str, str]]:
+    """(name, bound) of the partitions of samples, without any still being detached."""
+    result = await conn.execute(
+        text(
+            """
+            SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+            FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = 'samples'::regclass AND NOT i.inhdetachpending
+            """
+        )
+    )
+    return result.all()
+
+
+async def list_partitions(conn) -> list[tuple[str, datetime, datetime]]:
+    """
+    Range partitions of samples as (name, start, end), oldest first, without the
+    catch-all one for older samples (see before_partition) or a default one.
+    """
+    partitions = []
+    for name, bound in await _child_bounds(conn):
+        match = _RANGE_BOUND.search(bound)
+        if match:
+            partitions.append(
+                (name, datetime.fromisoformat(match[1]), datetime.fromisoformat(match[2]))
+            )
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+async def before_partition(conn) -> Optional[tuple[str, datetime]]:
+    """(name, end) of the partition catching every sample before the range partitions, if any."""
+    for name, bound in await _child_bounds(conn):
+        match = _BEFORE_BOUND.search(bound)
+        if match:
+            return name, datetime.fromisoformat(match[1])
+    return None
+
+
+async def detach_pending(conn) -> list[str]:
+    """Partitions left half-detached by an interrupted DETACH ... CONCURRENTLY."""
+    result = await conn.execute(
+        text(
+            """
+            SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = 'samples'::regclass AND i.inhdetachpending
+            """
+        )
+    )
+    return list(result.scalars().all())
+
+
+async def _attach(conn, name: str, bound: str) -> str:
+    # CREATE TABLE ... PARTITION OF would lock samples ACCESS EXCLUSIVE; attaching
+    # an empty table only takes SHARE UPDATE EXCLUSIVE, so writes carry on
+    await conn.execute(text(f"CREATE TABLE {name} (LIKE samples INCLUDING DEFAULTS)"))
+    await conn.execute(text(f"ALTER TABLE samples ATTACH PARTITION {name} FOR VALUES {bound}"))
+    return name
+
+
+async def create_partition(conn, start: datetime, end: datetime) -> str:
+    return await _attach(
+        conn, partition_name(start), f"FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    )
+
+
+async def create_before_partition(conn, end: datetime) -> str:
+    return await _attach(conn, before_partition_name(end), f"FROM (MINVALUE) TO ('{end.isoformat()}')")
+
+
+async def bump_place_versions(conn, place_ids) -> None:
+    """
+    Bump the data version of places whose samples are being deleted or
+    rewritten, inside the caller's transaction. Locks the rows in ID order
+    first, like SampleRepository does for new samples.
+    """
+    ids = sorted(set(place_ids))
+    if not ids:
+        return
+    await conn.execute(
+        text("SELECT id FROM places WHERE id = ANY(:ids) ORDER BY id FOR NO KEY UPDATE"),
+        {"ids": ids},
+    )
+    await conn.execute(
+        text("UPDATE places SET data_version = data_version + 1 WHERE id = ANY(:ids)"),
+        {"ids": ids},
+    )
+
+
+def missing_partitions(
+    existing: list[tuple[str, datetime, datetime]], first: datetime, last: datetime, months: int
+) -> list[tuple[datetime, datetime]]:
+    """(start, end) of the partitions from `first` through `last` that overlap no existing one."""
+    missing = []
+    start = partition_start(first, months)
+    while start <= last:
+        end = add_months(start, months)
+        if not any(other_start < end and start < other_end for _, other_start, other_end in existing):
+            missing.append((start, end))
+        start = end
+    return missing
+
+
+class SampleMaintenance:
+    """
+    Periodic upkeep of the samples table, run by one worker at a time (under an
+    advisory lock) every SAMPLE_MAINTENANCE_INTERVAL seconds:
+
+    - once samples is partitioned by timestamp (scripts/partition_samples.py),
+      partitions are created SAMPLE_PARTITIONS_AHEAD periods in advance, so new
+      samples always have a partition to land in;
+    - with SAMPLE_RETENTION_DAYS set, samples older than that are deleted with
+      their readings: whole partitions are detached concurrently and dropped,
+      the rest deleted in batches.
+      fingerprint_stats is kept as the summary of the deleted data, and the
+      data version of the affected places is bumped, so their cached exports
+      and ETags change.
+    """
+
+    def __init__(self, interval: float, retention_days: int, partition_months: int, partitions_ahead: int):
+        self.interval = interval
+        self.retention_days = retention_days
+        self.partition_months = partition_months
+        self.partitions_ahead = partitions_ahead
+        self.runs = 0
+        self.created_partitions = 0
+        self.dropped_partitions = 0
+        self.deleted_samples = 0
+        self.last_run_seconds = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+            except Exception as e:
+                logging.error(f"Error maintaining samples: {str(e)}")
+
+    async def run_once(self, now: Optional[datetime] = None) -> Optional[dict]:
+        """One maintenance pass; returns what it did, or None if another worker holds the lock."""
+        now = now or datetime.now(timezone.utc)
+        started = time.perf_counter()
+        summary = {"created_partitions": [], "dropped_partitions": [], "deleted_samples": 0}
+
+        async with engine.connect() as conn:
+            locked = (
+                await conn.execute(
+                    text("SELECT pg_try_advisory_lock(:key)"), {"key": MAINTENANCE_LOCK_KEY}
+                )
+            ).scalar()
+            await conn.commit()
+            if not locked:
+                return None
+            try:
+                partitioned = await is_partitioned(conn)
+                await conn.commit()
+                if partitioned:
+                    summary["created_partitions"] = await self._create_ahead(conn, now)
+                if self.retention_days > 0:
+                    cutoff = now - timedelta(days=self.retention_days)
+                    if partitioned:
+                        summary["dropped_partitions"], summary["deleted_samples"] = (
+                            await self._drop_partitions(conn, cutoff)
+                        )
+                    summary["deleted_samples"] += await self._delete_rows(conn, cutoff)
+            finally:
+                await conn.rollback()
+                await conn.execute(
+                    text("SELECT pg_advisory_unlock(:key)"), {"key": MAINTENANCE_LOCK_KEY}
+                )
+                await conn.commit()
+
+        self.runs += 1
+        self.created_partitions += len(summary["created_partitions"])
+        self.dropped_partitions += len(summary["dropped_partitions"])
+        self.deleted_samples += summary["deleted_samples"]
+        self.last_run_seconds = time.perf_counter() - started
+        if summary["created_partitions"] or summary["dropped_partitions"] or summary["deleted_samples"]:
+            logging.info(f"Sample maintenance: {summary}")
+        return summary
+
+    async def _create_ahead(self, conn, now: datetime) -> list[str]:
+        existing = await list_partitions(conn)
+        await conn.commit()
+        last = add_months(partition_start(now, self.partition_months), self.partition_months * self.partitions_ahead)
+        created = []
+        for start, end in missing_partitions(existing, now, last, self.partition_months):
+            try:
+                async with conn.begin():
+                    created.append(await create_partition(conn, start, end))
+            except Exception as e:
+                # e.g. a default partition (older conversions) already holds samples in this range
+                logging.error(f"Error creating the samples partition from {start.isoformat()}: {str(e)}")
+        return created
+
+    async def _drop_partitions(self, conn, cutoff: datetime) -> tuple[list[str], int]:
+        """
+        Drop the range partitions ending before the cutoff, and move the partition
+        catching older samples up to where the remaining ones start. Partitions
+        are detached with DETACH PARTITION ... CONCURRENTLY first, which unlike
+        DROP TABLE does not lock samples against reads and writes.
+        """
+        partitions = await list_partitions(conn)
+        before = await before_partition(conn)
+        pending = await detach_pending(conn)
+        # Not possible with a DEFAULT partition (tables converted by older versions
+        # of partition_samples.py), which then briefly block samples instead
+        concurrently = not await has_default_partition(conn)
+        await conn.commit()
+        expired = [(name, end) for name, _, end in partitions if end <= cutoff]
+        if expired and not concurrently:
+            logging.warning(
+                "samples has a DEFAULT partition, so expired partitions are detached "
+                "without CONCURRENTLY; move its rows into a MINVALUE partition to avoid it"
+            )
+
+        dropped, deleted = [], 0
+        async with engine.connect() as detach_conn:
+            # DETACH ... CONCURRENTLY cannot run inside a transaction block
+            await detach_conn.execution_options(isolation_level="AUTOCOMMIT")
+            for name in pending:
+                # Interrupted in an earlier run, after the detach had started
+                await detach_conn.execute(text(f"ALTER TABLE samples DETACH PARTITION {name} FINALIZE"))
+                deleted += await self._drop_detached(conn, name)
+                dropped.append(name)
+            for name, _ in expired:
+                await self._detach(conn, detach_conn, name, concurrently)
+                deleted += await self._drop_detached(conn, name)
+                dropped.append(name)
+
+            if expired and concurrently:
+                # Its samples are older than the dropped partitions, so expired too;
+                # its replacement has to be attached once it is gone, as the ranges
+                # would overlap
+                if before is not None:
+                    await self._detach(conn, detach_conn, before[0], concurrently)
+                async with conn.begin():
+                    await create_before_partition(conn, expired[-1][1])
+                if before is not None:
+                    deleted += await self._drop_detached(conn, before[0])
+                    dropped.append(before[0])
+        return dropped, deleted
+
+    async def _detach(self, conn, detach_conn, name: str, concurrently: bool) -> None:
+        if concurrently:
+            await detach_conn.execute(
+                text(f"ALTER TABLE samples DETACH PARTITION {name} CONCURRENTLY")
+            )
+        else:
+            async with conn.begin():
+                await conn.execute(text(f"ALTER TABLE samples DETACH PARTITION {name}"))
+
+    async def _drop_detached(self, conn, name: str) -> int:
+        """Drop a partition detached from samples with its readings; returns its sample count."""
+        async with conn.begin():
+            result = await conn.execute(
+                text(f"SELECT DISTINCT l.place_id FROM {name} s JOIN locations l ON l.id = s.location_id")
+            )
+            await bump_place_versions(conn, result.scalars().all())
+            deleted = (await conn.execute(text(f"SELECT count(*) FROM {name}"))).scalar()
+            # rssi_values has no foreign key to a partitioned samples table
+            await conn.execute(
+                text(f"DELETE FROM rssi_values WHERE sample_id IN (SELECT id FROM {name})")
+            )
+            await conn.execute(text(f"DROP TABLE {name}"))
+        return deleted
+
+    async def _delete_rows(self, conn, cutoff: datetime) -> int:
+        deleted = 0
+        while True:
+            async with conn.begin():
+                result = await conn.execute(
+                    text(
+                        """
+                        SELECT s.id, l.place_id FROM samples s JOIN locations l ON l.id = s.location_id
+                        WHERE s."timestamp" < :cutoff LIMIT :limit
+                        """
+                    ),
+                    {"cutoff": cutoff, "limit": RETENTION_BATCH_SIZE},
+                )
+                rows = result.all()
+                if not rows:
+                    return deleted
+                sample_ids = [sample_id for sample_id, _ in rows]
+                await bump_place_versions(conn, [place_id for _, place_id in rows])
+                await conn.execute(
+                    text("DELETE FROM rssi_values WHERE sample_id = ANY(:ids)"), {"ids": sample_ids}
+                )
+                await conn.execute(
+                    text('DELETE FROM samples WHERE id = ANY(:ids) AND "timestamp" < :cutoff'),
+                    {"ids": sample_ids, "cutoff": cutoff},
+                )
+            deleted += len(sample_ids)
+
+    def stats(self) -> dict:
+        return {
+            "runs": self.runs,
+            "created_partitions": self.created_partitions,
+            "dropped_partitions": self.dropped_partitions,
+            "deleted_samples": self.deleted_samples,
+            "last_run_seconds": self.last_run_seconds,
+        }
+
+
+sample_maintenance = SampleMaintenance(
+    interval=settings.SAMPLE_MAINTENANCE_INTERVAL,
+    retention_days=settings.SAMPLE_RETENTION_DAYS,
+    partition_months=settings.SAMPLE_PARTITION_MONTHS,
+    partitions_ahead=settings.SAMPLE_PARTITIONS_AHEAD,
+)
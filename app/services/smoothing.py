@@ -0,0 +1,119 @@
+from collections import deque
+from typing import Optional
+from app.config import settings
+from app.services.encoder import MISSING_RSSI
+
+SMOOTHING_MODES = ("none", "ema", "hmm")
+
+
+class PredictionSmoother:
+    """
+    State of one streaming prediction connection, so consecutive scans of a
+    moving client are not scored in isolation.
+
+    - Input window: each scan is replaced by the per-BSSID mean RSSI of the last
+      `window` scans (a BSSID missing from a scan counts as -100 there).
+    - mode "ema": exponential moving average of the location probabilities, with
+      weight `alpha` on the newest scan.
+    - mode "hmm": forward filtering with a transition prior that keeps the previous
+      location with probability `stay` and spreads the rest evenly over the others.
+    - Delta gating: a scan that differs from the last scored one by less than
+      `gate_db` dB on average is not scored, the last result is reused instead.
+    """
+
+    def __init__(
+        self, mode: str = "none", alpha: float = 0.5, stay: float = 0.9, window: int = 1, gate_db: float = 0.0
+    ):
+        if mode not in SMOOTHING_MODES:
+            raise ValueError(f"Unknown smoothing mode {mode!r}, expected one of {SMOOTHING_MODES}")
+        if not 0 < alpha <= 1 or not 0 <= stay <= 1 or window < 1 or gate_db < 0:
+            raise ValueError("Expected 0 < alpha <= 1, 0 <= stay <= 1, window >= 1 and gate_db >= 0")
+        self.mode = mode
+        self.alpha = alpha
+        self.stay = stay
+        self.gate_db = gate_db
+        self.scored = 0
+        self.gated = 0
+        self._scans: deque[dict] = deque(maxlen=window)
+        self._pending: Optional[dict] = None
+        self._last_scored: Optional[dict] = None
+        self._state: dict[str, float] = {}
+        self.result: list[tuple[str, float]] = []
+
+    @classmethod
+    def from_settings(cls, mode: Optional[str] = None, gate_db: Optional[float] = None) -> "PredictionSmoother":
+        """A smoother with the PREDICT_* defaults, optionally overriding the mode and gate."""
+        return cls(
+            mode=mode if mode is not None else settings.PREDICT_SMOOTHING,
+            alpha=settings.PREDICT_EMA_ALPHA,
+            stay=settings.PREDICT_HMM_STAY,
+            window=settings.PREDICT_RSSI_WINDOW,
+            gate_db=gate_db if gate_db is not None else settings.PREDICT_GATE_DB,
+        )
+
+    @staticmethod
+    def _distance(scan: dict, previous: dict) -> float:
+        """Mean absolute RSSI difference over the BSSIDs seen in either scan."""
+        bssids = scan.keys() | previous.keys()
+        if not bssids:
+            return 0.0
+        return sum(
+            abs(scan.get(bssid, MISSING_RSSI) - previous.get(bssid, MISSING_RSSI))
+            for bssid in bssids
+        ) / len(bssids)
+
+    def _windowed(self) -> dict:
+        if len(self._scans) == 1:
+            return self._scans[0]
+        bssids = set().union(*self._scans)
+        return {
+            bssid: round(sum(scan.get(bssid, MISSING_RSSI) for scan in self._scans) / len(self._scans))
+            for bssid in bssids
+        }
+
+    def observe(self, rssi_values: dict) -> Optional[dict]:
+        """
+        Add a scan. Returns the scan to score (the window mean), or None when it is
+        gated and `result` still holds.
+        """
+        self._scans.append(rssi_values)
+        if (
+            self.gate_db > 0
+            and self._last_scored is not None
+            and self._distance(rssi_values, self._last_scored) < self.gate_db
+        ):
+            self.gated += 1
+            return None
+        self._pending = rssi_values
+        return self._windowed()
+
+    def update(self, predictions: list[tuple[str, float]]) -> list[tuple[str, float]]:
+        """Fold the model's (location, probability) pairs for the observed scan into the state."""
+        self.scored += 1
+        self._last_scored = self._pending
+        if self.mode == "ema" and self._state:
+            smoothed = {
+                location: self.alpha * probability + (1 - self.alpha) * self._state.get(location, 0.0)
+                for location, probability in predictions
+            }
+        elif self.mode == "hmm" and self._state:
+            others = max(len(predictions) - 1, 1)
+            smoothed = {}
+            for location, probability in predictions:
+                previous = self._state.get(location, 0.0)
+                prior = self.stay * previous + (1 - self.stay) * (1 - previous) / others
+                smoothed[location] = probability * prior
+        else:
+            smoothed = dict(predictions)
+
+        total = sum(smoothed.values())
+        if total > 0:
+            smoothed = {location: value / total for location, value in smoothed.items()}
+        else:
+            # The model ruled out every location the state still believed in
+            smoothed = dict(predictions)
+
+        if self.mode != "none":
+            self._state = smoothed
+        self.result = list(smoothed.items())
+        return list(self.result)
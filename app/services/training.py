@@ -0,0 +1,272 @@
+import os
+import uuid
+import pickle
+import shutil
+import tempfile
+import asyncio
+import logging
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from whereami.utils import get_model_file
+from app.config import settings
+from app.database import AsyncSessionLocal, SnapshotSessionLocal
+from app.models.training_job import TrainingJob
+from app.repositories.rssi_value import RSSIValueRepository
+from app.repositories.sample import SampleRepository
+from app.repositories.training_job import TrainingJobRepository
+from app.services.encoder import BSSIDEncoder
+from app.services.executor import run_cpu_bound
+from app.services.model_registry import ModelRegistry
+from app.services.place_catalog import place_catalog
+from app.services.predictors import save_fingerprints
+
+
+def fit_model(X: np.ndarray, y: np.ndarray) -> RandomForestClassifier:
+    """Fit the same classifier whereami uses on a dense encoded matrix."""
+    clf = RandomForestClassifier(n_estimators=100, class_weight="balanced")
+    clf.fit(X, y)
+    return clf
+
+
+def publish_model(
+    model_dir: str,
+    model,
+    encoder: BSSIDEncoder,
+    X: Optional[np.ndarray] = None,
+    y: Optional[np.ndarray] = None,
+) -> None:
+    """
+    Publish a trained model as model_dir. The model, its vocabulary and the
+    training fingerprints (used by the knn and centroid engines) are written into
+    a new version directory next to it, then model_dir, a symlink to the current
+    version, is swapped to it with an atomic rename, so a load that resolves it
+    once (see load_model) never pairs files of two versions. The version it
+    replaces is kept for loads that already resolved it; older ones are removed.
+    """
+    parent, name = os.path.split(os.path.abspath(model_dir))
+    os.makedirs(parent, exist_ok=True)
+    version_dir = tempfile.mkdtemp(prefix=f"{name}.", dir=parent)
+    os.chmod(version_dir, 0o755)
+    encoder.save(version_dir)
+    if X is not None and y is not None:
+        save_fingerprints(version_dir, X, y)
+    with open(get_model_file(version_dir), "wb") as f:
+        pickle.dump(model, f)
+
+    previous = None
+    if os.path.islink(model_dir):
+        previous = os.path.realpath(model_dir)
+    elif os.path.isdir(model_dir):
+        # Published before models were versioned: becomes a version of its own
+        previous = f"{model_dir}.{uuid.uuid4().hex}"
+        os.rename(model_dir, previous)
+    link = os.path.join(parent, f".{name}.{uuid.uuid4().hex}")
+    os.symlink(os.path.basename(version_dir), link)
+    os.replace(link, model_dir)
+
+    for entry in os.listdir(parent):
+        path = os.path.join(parent, entry)
+        if entry.startswith(f"{name}.") and path not in (version_dir, previous):
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def train_and_publish(model_dir: str, bssids: list[str], X: np.ndarray, y: np.ndarray) -> None:
+    """Process pool entry point: fit a model and publish it into model_dir."""
+    publish_model(model_dir, fit_model(X, y), BSSIDEncoder(bssids), X, y)
+
+
+async def load_training_data(
+    place_id: int,
+    version: int,
+    chunk_size: int,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> tuple[list[str], np.ndarray, np.ndarray]:
+    """
+    Read and encode the samples of a place up to a data version, optionally in a
+    time window, as (bssids, X, y).
+    """
+    # One snapshot, so the vocabulary matches the samples in both layouts
+    async with SnapshotSessionLocal() as session:
+        rssi_repo = RSSIValueRepository(session)
+        bssids = await rssi_repo.get_place_bssids(
+            place_id, max_version=version, since=since, until=until
+        )
+        encoder = BSSIDEncoder(bssids)
+
+        chunks, labels, scans = [], [], []
+        async for location_name, _, rssi_dict in rssi_repo.stream_place_samples(
+            place_id,
+            chunk_size=chunk_size,
+            max_version=version,
+            since=since,
+            until=until,
+            bssids=bssids,
+        ):
+            labels.append(location_name)
+            scans.append(rssi_dict)
+            if len(scans) >= chunk_size:
+                chunks.append(await run_cpu_bound(encoder.encode_batch, scans))
+                scans = []
+        if scans:
+            chunks.append(await run_cpu_bound(encoder.encode_batch, scans))
+
+    if not chunks:
+        return bssids, np.empty((0, len(bssids)), dtype=np.float32), np.asarray(labels)
+    X = await run_cpu_bound(np.concatenate, chunks)
+    return bssids, X, np.asarray(labels)
+
+
+class TrainingService:
+    """
+    Runs training jobs in the background. Training data is read straight from the
+    database and fitting happens in a process pool, so the API stays responsive.
+    Only one job per place runs at a time in this process.
+    """
+
+    def __init__(self, max_workers: int, chunk_size: int):
+        self.max_workers = max_workers
+        self.chunk_size = chunk_size
+        self._pool: Optional[ProcessPoolExecutor] = None
+        # place_id -> the place's job ID, pending while a request is starting the job
+        self._running: dict[int, asyncio.Future] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn: forking a process that runs an event loop and thread pools is unsafe
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._pool
+
+    async def is_up_to_date(self, session, place_id: int) -> Optional[TrainingJob]:
+        """
+        Return the last successful job if it trained on every sample (no time
+        window), the place's samples did not change since it ran and its model is
+        still on disk, otherwise None.
+        """
+        last_job = await TrainingJobRepository(session).get_latest_succeeded_job(place_id)
+        if (
+            last_job is None
+            or last_job.data_version is None
+            or last_job.since is not None
+            or last_job.until is not None
+        ):
+            return None
+        version = await SampleRepository(session).get_place_version(place_id)
+        model_file = get_model_file(ModelRegistry.model_dir(place_id))
+        if version <= last_job.data_version and os.path.exists(model_file):
+            return last_job
+        return None
+
+    def reserve(self, place_id: int) -> bool:
+        """
+        Claim the job slot of a place; False if it is taken. Synchronous, so two
+        requests cannot both claim it. The caller must then start() a job or
+        release() the slot.
+        """
+        if place_id in self._running:
+            return False
+        self._running[place_id] = asyncio.get_running_loop().create_future()
+        return True
+
+    def release(self, place_id: int) -> None:
+        """Give back a slot claimed with reserve() without starting a job."""
+        slot = self._running.get(place_id)
+        if slot is not None and not slot.done():
+            slot.set_result(None)
+            del self._running[place_id]
+
+    async def running_job(self, place_id: int) -> Optional[int]:
+        """
+        ID of the job running for a place, or None. Waits while another request
+        is starting one, and returns None if that request released the slot.
+        """
+        slot = self._running.get(place_id)
+        if slot is None:
+            return None
+        return await asyncio.shield(slot)
+
+    async def start(
+        self,
+        session,
+        place_id: int,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> TrainingJob:
+        """
+        Create a job for a place whose slot was claimed with reserve() and run it
+        in the background, optionally on a time window.
+        """
+        job = await TrainingJobRepository(session).create_job(place_id, since, until)
+        self._running[place_id].set_result(job.id)
+        task = asyncio.create_task(self._run(job.id, place_id, since, until))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    async def _run(
+        self,
+        job_id: int,
+        place_id: int,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> None:
+        try:
+            async with AsyncSessionLocal() as session:
+                job_repo = TrainingJobRepository(session)
+                version = await SampleRepository(session).get_place_version(place_id)
+                await job_repo.mark_running(job_id, version)
+
+                try:
+                    if version == 0:
+                        raise ValueError(f"No samples found for place with ID {place_id}")
+                    bssids, X, y = await load_training_data(
+                        place_id, version, self.chunk_size, since, until
+                    )
+                    if len(y) == 0:
+                        raise ValueError(
+                            f"No samples found for place with ID {place_id} in the requested time window"
+                        )
+
+                    loop = asyncio.get_running_loop()
+                    await loop.run_in_executor(
+                        self._get_pool(),
+                        train_and_publish,
+                        ModelRegistry.model_dir(place_id),
+                        bssids,
+                        X,
+                        y,
+                    )
+                except Exception as e:
+                    logging.error(f"Training job {job_id} for place {place_id} failed: {str(e)}")
+                    await job_repo.mark_finished(job_id, error=str(e) or type(e).__name__)
+                else:
+                    logging.info(f"Training job {job_id} published a model for place {place_id}")
+                    await job_repo.mark_finished(job_id, samples_used=len(y))
+                    try:
+                        # New connects to the place see the model right away
+                        await place_catalog.refresh([place_id])
+                    except Exception as e:
+                        logging.error(f"Error refreshing place {place_id} in the catalog: {str(e)}")
+        finally:
+            self._running.pop(place_id, None)
+
+    async def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+training_service = TrainingService(
+    max_workers=settings.TRAINING_MAX_WORKERS, chunk_size=settings.EXPORT_CHUNK_ROWS
+)
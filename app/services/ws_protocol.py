@@ -0,0 +1,117 @@
+import json
+import heapq
+from typing import Any, Optional
+
+try:
+    import orjson
+except ImportError:  # optional, only speeds up the JSON codec
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# WebSocket subprotocols of the compact prediction protocol
+SUBPROTOCOL_MSGPACK = "dishasarthi.msgpack.v1"
+SUBPROTOCOL_JSON = "dishasarthi.json.v1"
+
+
+class ProtocolError(ValueError):
+    """Raised for a frame that does not follow the compact protocol."""
+
+
+class JSONCodec:
+    """Text frames, encoded with orjson when it is installed."""
+
+    subprotocol = SUBPROTOCOL_JSON
+    binary = False
+
+    def loads(self, data) -> Any:
+        try:
+            if orjson is not None:
+                return orjson.loads(data)
+            return json.loads(data)
+        except (ValueError, TypeError):
+            raise ProtocolError("Invalid JSON frame")
+
+    def dumps(self, message) -> str:
+        if orjson is not None:
+            return orjson.dumps(message).decode()
+        return json.dumps(message, separators=(",", ":"))
+
+
+class MsgpackCodec:
+    """Binary MessagePack frames."""
+
+    subprotocol = SUBPROTOCOL_MSGPACK
+    binary = True
+
+    def loads(self, data) -> Any:
+        try:
+            return msgpack.unpackb(data)
+        except (ValueError, TypeError):
+            raise ProtocolError("Invalid MessagePack frame")
+
+    def dumps(self, message) -> bytes:
+        return msgpack.packb(message)
+
+
+def negotiate(offered: list[str]):
+    """
+    Pick the codec for the first supported subprotocol the client offered, or None
+    for the original JSON protocol.
+    """
+    for subprotocol in offered:
+        if subprotocol == SUBPROTOCOL_MSGPACK and msgpack is not None:
+            return MsgpackCodec()
+        if subprotocol == SUBPROTOCOL_JSON:
+            return JSONCodec()
+    return None
+
+
+def decode_scan(
+    message: Any, vocabulary: list[str], max_top_k: int
+) -> tuple[dict[str, int], Optional[int]]:
+    """
+    Turn a compact request into ({bssid: rssi}, top_k). Scans are sent either as
+    parallel lists of vocabulary indices and RSSI values {"i": [...], "r": [...]},
+    or as {"rssi_values": {BSSID: RSSI}} for BSSIDs missing from the vocabulary.
+    An optional "k", up to max_top_k, asks for a different number of top locations.
+    """
+    if not isinstance(message, dict):
+        raise ProtocolError("Expected a map with 'i' and 'r' or 'rssi_values'")
+
+    top_k = message.get("k")
+    if top_k is not None and (
+        not isinstance(top_k, int) or isinstance(top_k, bool) or not 1 <= top_k <= max_top_k
+    ):
+        raise ProtocolError(f"'k' must be an integer from 1 to {max_top_k}")
+
+    if "rssi_values" in message:
+        rssi_values = message["rssi_values"]
+        if not isinstance(rssi_values, dict):
+            raise ProtocolError("'rssi_values' must be a map of BSSID to RSSI")
+        return rssi_values, top_k
+
+    indices, values = message.get("i"), message.get("r")
+    if not isinstance(indices, list) or not isinstance(values, list) or len(indices) != len(values):
+        raise ProtocolError("'i' and 'r' must be lists of the same length")
+    if not all(isinstance(index, int) and 0 <= index < len(vocabulary) for index in indices):
+        raise ProtocolError(f"BSSID indices must be integers from 0 to {len(vocabulary) - 1}")
+    return {vocabulary[index]: rssi for index, rssi in zip(indices, values)}, top_k
+
+
+def encode_prediction(predictions: list[tuple[str, float]], top_k: int) -> dict:
+    """
+    Compact reply: the most likely location "p", its confidence "c" and the top_k
+    (location, confidence) pairs "k".
+    """
+    top = heapq.nlargest(top_k, predictions, key=lambda prediction: prediction[1])
+    if not top:
+        return {"p": None, "c": 0.0, "k": []}
+    return {
+        "p": top[0][0],
+        "c": top[0][1],
+        "k": [[location, confidence] for location, confidence in top],
+    }
@@ -0,0 +1,94 @@
+import sys
+import json
+import argparse
+
+# (path in the results, True if higher is better)
+METRICS = [
+    ("collect.samples_per_second", True),
+    ("collect.latency.p50_ms", False),
+    ("collect.latency.p99_ms", False),
+    ("collect.peak_rss_mb", False),
+    ("export.formats.*.cold_seconds", False),
+    ("export.formats.*.warm_latency.p50_ms", False),
+    ("export.formats.*.warm_latency.p99_ms", False),
+    ("export.peak_rss_mb", False),
+    ("predict.scans_per_second", True),
+    ("predict.latency.p50_ms", False),
+    ("predict.latency.p99_ms", False),
+    ("predict.accuracy", True),
+    ("predict.peak_rss_mb", False),
+]
+
+
+def lookup(results: dict, path: str) -> dict:
+    """Values at a dotted path, where "*" matches every key; returns {concrete path: value}."""
+    found = {"": results}
+    for part in path.split("."):
+        matched = {}
+        for prefix, value in found.items():
+            if not isinstance(value, dict):
+                continue
+            keys = value.keys() if part == "*" else [part] if part in value else []
+            for key in keys:
+                matched[f"{prefix}.{key}" if prefix else key] = value[key]
+        found = matched
+    return found
+
+
+def compare(baseline: dict, candidate: dict, threshold: float) -> list[dict]:
+    rows = []
+    for path, higher_is_better in METRICS:
+        before = lookup(baseline["results"], path)
+        after = lookup(candidate["results"], path)
+        for metric in sorted(before.keys() & after.keys()):
+            if not before[metric]:
+                continue
+            change = (after[metric] - before[metric]) / before[metric]
+            worse = -change if higher_is_better else change
+            rows.append(
+                {
+                    "metric": metric,
+                    "baseline": before[metric],
+                    "candidate": after[metric],
+                    "change": change,
+                    "regression": worse > threshold,
+                }
+            )
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare two benchmarks/run.py result files and flag regressions"
+    )
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument(
+        "--threshold", type=float, default=0.1, help="Relative change counted as a regression"
+    )
+    parser.add_argument("--json", action="store_true", help="Print the comparison as JSON")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+    rows = compare(baseline, candidate, args.threshold)
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print(f"{baseline['meta'].get('commit') or 'baseline'} -> {candidate['meta'].get('commit') or 'candidate'}")
+        print(f"{'metric':<45}{'baseline':>12}{'candidate':>12}{'change':>9}")
+        for row in rows:
+            print(
+                f"{row['metric']:<45}{row['baseline']:>12.3f}{row['candidate']:>12.3f}"
+                f"{row['change']:>+9.1%}{'  REGRESSION' if row['regression'] else ''}"
+            )
+
+    # Non-zero exit status for CI
+    sys.exit(1 if any(row["regression"] for row in rows) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+import os
+import sys
+import glob
+import json
+import time
+import uuid
+import shutil
+import random
+import logging
+import argparse
+import platform
+import resource
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import msgpack
+import numpy as np
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+# One line per request otherwise
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+# Define the paths
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Make the app package importable when run as `python benchmarks/run.py`
+sys.path.insert(0, BASE_DIR)
+from fastapi.testclient import TestClient
+from prometheus_client.parser import text_string_to_metric_families
+from sqlalchemy import text
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.main import app
+from app.routes.output import OUTPUT_DIR
+from app.services.model_registry import ModelRegistry
+from benchmarks.synthetic import Building
+
+SUITES = ("collect", "export", "predict")
+
+
+def latency_summary(latencies: list[float]) -> dict:
+    latencies_ms = np.asarray(latencies) * 1000
+    return {
+        "count": len(latencies),
+        "mean_ms": float(latencies_ms.mean()),
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p99_ms": float(np.percentile(latencies_ms, 99)),
+    }
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far (training runs in child processes)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def stage_means(client: TestClient) -> dict:
+    """Mean milliseconds per {endpoint}.{stage} from /metrics, cumulative for the run."""
+    sums, counts = {}, {}
+    for family in text_string_to_metric_families(client.get("/metrics").text):
+        if family.name != "dishasarthi_stage_seconds":
+            continue
+        for sample in family.samples:
+            key = f"{sample.labels['endpoint']}.{sample.labels['stage']}"
+            if sample.name.endswith("_sum"):
+                sums[key] = sample.value
+            elif sample.name.endswith("_count"):
+                counts[key] = sample.value
+    return {key: sums[key] / counts[key] * 1000 for key in sorted(sums) if counts.get(key)}
+
+
+def bench_collect(client: TestClient, building: Building, place: str, args) -> tuple[dict, int]:
+    """POST every synthetic upload, `concurrency` at a time."""
+    uploads = list(
+        building.uploads("benchmark", place, args.samples_per_location, args.batch_size)
+    )
+
+    def post(payload):
+        started = time.perf_counter()
+        response = client.post("/collect/", json=payload)
+        elapsed = time.perf_counter() - started
+        if response.status_code != 201:
+            raise RuntimeError(
+                f"/collect answered {response.status_code} (the benchmark needs INGEST_ASYNC=false): {response.text}"
+            )
+        return elapsed, response.json()["details"]["place_id"]
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        results = list(pool.map(post, uploads))
+    seconds = time.perf_counter() - started
+
+    samples = sum(len(upload["samples"]) for upload in uploads)
+    readings = sum(len(sample["rssi_values"]) for upload in uploads for sample in upload["samples"])
+    return {
+        "uploads": len(uploads),
+        "samples": samples,
+        "readings": readings,
+        "seconds": seconds,
+        "uploads_per_second": len(uploads) / seconds,
+        "samples_per_second": samples / seconds,
+        "readings_per_second": readings / seconds,
+        "latency": latency_summary([elapsed for elapsed, _ in results]),
+    }, results[0][1]
+
+
+def bench_export(client: TestClient, place_id: int, args) -> dict:
+    """One cold (building) and `export_repeats` warm (cached) downloads per format."""
+    results = {}
+    for export_format in args.formats.split(","):
+        url = f"/output/{place_id}?format={export_format}"
+        started = time.perf_counter()
+        response = client.get(url)
+        cold_seconds = time.perf_counter() - started
+        if response.status_code != 200:
+            raise RuntimeError(f"{url} answered {response.status_code}: {response.text[:200]}")
+        size = len(response.content)
+
+        warm = []
+        for _ in range(args.export_repeats):
+            started = time.perf_counter()
+            client.get(url).raise_for_status()
+            warm.append(time.perf_counter() - started)
+
+        results[export_format] = {
+            "bytes": size,
+            "cold_seconds": cold_seconds,
+            "cold_mb_per_second": size / (1024 * 1024) / cold_seconds,
+            "warm_latency": latency_summary(warm),
+        }
+    return {"formats": results}
+
+
+def train(client: TestClient, place_id: int, timeout: float) -> dict:
+    started = time.perf_counter()
+    response = client.post(f"/train/{place_id}")
+    response.raise_for_status()
+    job_id = response.json()["job"]["id"]
+    while time.perf_counter() - started < timeout:
+        job = client.get(f"/train/jobs/{job_id}").json()
+        if job["status"] == "succeeded":
+            return {"seconds": time.perf_counter() - started, "samples": job["samples_used"]}
+        if job["status"] == "failed":
+            raise RuntimeError(f"Training failed: {job['error']}")
+        time.sleep(0.2)
+    raise RuntimeError(f"Training did not finish within {timeout} seconds")
+
+
+def _send(ws, protocol: str, message: dict) -> None:
+    if protocol == "msgpack":
+        ws.send_bytes(msgpack.packb(message))
+    else:
+        ws.send_text(json.dumps(message))
+
+
+def _receive(ws, protocol: str) -> dict:
+    if protocol == "msgpack":
+        return msgpack.unpackb(ws.receive_bytes())
+    return json.loads(ws.receive_text())
+
+
+def bench_predict(client: TestClient, building: Building, place_id: int, args) -> dict:
+    """
+    `connections` concurrent WebSockets, each sending `scans_per_connection` fresh
+    scans of random locations and waiting for every reply (round-trip latency).
+    """
+    rng = random.Random(args.seed)
+    walks = [
+        [rng.randrange(args.locations) for _ in range(args.scans_per_connection)]
+        for _ in range(args.connections)
+    ]
+    scans = [[building.scan(location) for location in walk] for walk in walks]
+    subprotocols = [] if args.protocol == "json" else [f"dishasarthi.{args.protocol}.v1"]
+
+    def run_connection(index):
+        latencies, correct = [], 0
+        with client.websocket_connect(f"/predict/{place_id}", subprotocols=subprotocols) as ws:
+            hello = _receive(ws, args.protocol)
+            vocabulary = {bssid: i for i, bssid in enumerate(hello.get("vocabulary", []))}
+
+            for location, scan in zip(walks[index], scans[index]):
+                if args.protocol == "json":
+                    message = {"rssi_values": scan}
+                else:
+                    # Compact scans address BSSIDs by their index in the model's vocabulary
+                    known = [(vocabulary[bssid], rssi) for bssid, rssi in scan.items() if bssid in vocabulary]
+                    message = {"i": [i for i, _ in known], "r": [rssi for _, rssi in known]}
+                started = time.perf_counter()
+                _send(ws, args.protocol, message)
+                reply = _receive(ws, args.protocol)
+                latencies.append(time.perf_counter() - started)
+                prediction = reply.get("prediction", reply.get("p"))
+                correct += prediction == building.location_names[location]
+        return latencies, correct
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.connections) as pool:
+        results = list(pool.map(run_connection, range(args.connections)))
+    seconds = time.perf_counter() - started
+
+    latencies = [latency for connection, _ in results for latency in connection]
+    return {
+        "protocol": args.protocol,
+        "connections": args.connections,
+        "scans": len(latencies),
+        "seconds": seconds,
+        "scans_per_second": len(latencies) / seconds,
+        "accuracy": sum(correct for _, correct in results) / len(latencies),
+        "latency": latency_summary(latencies),
+    }
+
+
+async def _delete_place(place_id: int) -> None:
+    async with AsyncSessionLocal() as session, session.begin():
+        locations = "SELECT id FROM locations WHERE place_id = :place_id"
+        samples = f"SELECT id FROM samples WHERE location_id IN ({locations})"
+        for statement in (
+            f"DELETE FROM rssi_values WHERE sample_id IN ({samples})",
+            f"DELETE FROM samples WHERE location_id IN ({locations})",
+            f"DELETE FROM fingerprint_stats WHERE location_id IN ({locations})",
+            "DELETE FROM locations WHERE place_id = :place_id",
+            "DELETE FROM training_jobs WHERE place_id = :place_id",
+            "DELETE FROM places WHERE id = :place_id",
+        ):
+            await session.execute(text(statement), {"place_id": place_id})
+
+
+def cleanup(client: TestClient, place_id: int) -> None:
+    """Remove the benchmark place from the database, its model and its export files."""
+    client.portal.call(_delete_place, place_id)
+    model_dir = ModelRegistry.model_dir(place_id)
+    # The symlink publish_model swaps and the version directories it points to
+    for path in glob.glob(f"{model_dir}.*"):
+        shutil.rmtree(path, ignore_errors=True)
+    if os.path.islink(model_dir):
+        os.remove(model_dir)
+    for path in glob.glob(os.path.join(OUTPUT_DIR, f"{place_id}-v*")):
+        os.remove(path)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=BASE_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Benchmark /collect, /output/{place_id} and the /predict WebSocket in-process "
+            "against the database configured through POSTGRES_* (use a scratch database). "
+            "Results are printed as JSON; compare two runs with benchmarks/compare.py."
+        )
+    )
+    parser.add_argument("--suites", default=",".join(SUITES), help="Comma-separated suites")
+    parser.add_argument("--locations", type=int, default=20)
+    parser.add_argument("--bssids", type=int, default=60)
+    parser.add_argument("--samples-per-location", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=10, help="Samples per /collect upload")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent /collect uploads")
+    parser.add_argument("--formats", default="csv,long-csv", help="Export formats to benchmark")
+    parser.add_argument("--export-repeats", type=int, default=20, help="Cached downloads per format")
+    parser.add_argument("--connections", type=int, default=8, help="Concurrent prediction WebSockets")
+    parser.add_argument("--scans-per-connection", type=int, default=100)
+    parser.add_argument("--protocol", choices=("json", "msgpack"), default="json")
+    parser.add_argument("--train-timeout", type=float, default=300)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep", action="store_true", help="Keep the benchmark place and its files")
+    parser.add_argument("--output", help="Write the JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    suites = [suite.strip() for suite in args.suites.split(",")]
+    unknown = set(suites) - set(SUITES)
+    if unknown:
+        parser.error(f"Unknown suites {sorted(unknown)}, expected some of {SUITES}")
+    if "collect" not in suites:
+        parser.error("The collect suite loads the data the other suites use")
+
+    building = Building(locations=args.locations, bssids=args.bssids, seed=args.seed)
+    place = f"benchmark-{uuid.uuid4().hex[:8]}"
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+            "parameters": vars(args),
+            "settings": {
+                key: getattr(settings, key)
+                for key in (
+                    "EXECUTOR_KIND",
+                    "EXECUTOR_MAX_WORKERS",
+                    "DB_POOL_SIZE",
+                    "COLLECT_BULK_INSERT",
+                    "FINGERPRINT_STATS",
+                    "PREDICTOR_ENGINE",
+                    "PREDICT_BATCH_WINDOW_MS",
+                )
+            },
+        },
+        "results": {},
+    }
+    results = report["results"]
+
+    with TestClient(app) as client:
+        place_id = None
+        try:
+            logger.info(f"Collecting into place {place}")
+            results["collect"], place_id = bench_collect(client, building, place, args)
+            results["collect"]["peak_rss_mb"] = peak_rss_mb()
+
+            if "export" in suites:
+                logger.info("Exporting")
+                results["export"] = bench_export(client, place_id, args)
+                results["export"]["peak_rss_mb"] = peak_rss_mb()
+
+            if "predict" in suites:
+                logger.info("Training")
+                results["train"] = train(client, place_id, args.train_timeout)
+                logger.info("Predicting")
+                results["predict"] = bench_predict(client, building, place_id, args)
+                results["predict"]["peak_rss_mb"] = peak_rss_mb()
+
+            results["stages_mean_ms"] = stage_means(client)
+        finally:
+            if place_id is not None and not args.keep:
+                cleanup(client, place_id)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+        logger.info(f"Results written to {args.output}")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import math
+import random
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+
+# Log-distance path loss: RSSI = TX_POWER - 10 * PATH_LOSS_EXPONENT * log10(d / 1 m)
+TX_POWER = -40.0
+PATH_LOSS_EXPONENT = 3.0
+# Scans only report access points above the receiver sensitivity
+SENSITIVITY = -90
+MIN_RSSI, MAX_RSSI = -99, -30
+
+
+@dataclass
+class Building:
+    """
+    A synthetic single-floor building: locations on a grid `spacing` metres apart
+    and access points scattered over (and a little beyond) the floor. Each
+    (location, access point) pair has a fixed shadowing offset, so fingerprints are
+    stable per location while individual scans stay noisy and sparse.
+    """
+
+    locations: int = 20
+    bssids: int = 60
+    spacing: float = 5.0
+    shadowing_db: float = 4.0
+    noise_db: float = 2.0
+    drop_rate: float = 0.1
+    seed: int = 0
+    location_names: list[str] = field(init=False)
+
+    def __post_init__(self):
+        rng = random.Random(self.seed)
+        columns = math.ceil(math.sqrt(self.locations))
+        rows = math.ceil(self.locations / columns)
+        width, height = columns * self.spacing, rows * self.spacing
+
+        self.location_names = [f"room-{index:03d}" for index in range(self.locations)]
+        self._positions = [
+            ((index % columns + 0.5) * self.spacing, (index // columns + 0.5) * self.spacing)
+            for index in range(self.locations)
+        ]
+        margin = 2 * self.spacing
+        self._access_points = [
+            (
+                ":".join(f"{rng.randrange(256):02x}" for _ in range(6)),
+                rng.uniform(-margin, width + margin),
+                rng.uniform(-margin, height + margin),
+            )
+            for _ in range(self.bssids)
+        ]
+        self._shadowing = [
+            [rng.gauss(0.0, self.shadowing_db) for _ in self._access_points]
+            for _ in self._positions
+        ]
+        self._rng = random.Random(self.seed + 1)
+
+    def scan(self, location: int) -> dict[str, int]:
+        """One noisy scan at a location: {bssid: rssi} for the access points it hears."""
+        x, y = self._positions[location]
+        scan = {}
+        for (bssid, ap_x, ap_y), shadowing in zip(self._access_points, self._shadowing[location]):
+            distance = max(1.0, math.hypot(x - ap_x, y - ap_y))
+            rssi = (
+                TX_POWER
+                - 10 * PATH_LOSS_EXPONENT * math.log10(distance)
+                + shadowing
+                + self._rng.gauss(0.0, self.noise_db)
+            )
+            if rssi < SENSITIVITY or self._rng.random() < self.drop_rate:
+                continue
+            scan[bssid] = int(min(MAX_RSSI, max(MIN_RSSI, round(rssi))))
+        return scan
+
+    def uploads(self, username: str, place: str, samples_per_location: int, batch_size: int):
+        """/collect payloads with `samples_per_location` scans per location, `batch_size` per upload."""
+        started = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        for location, name in enumerate(self.location_names):
+            for first in range(0, samples_per_location, batch_size):
+                count = min(batch_size, samples_per_location - first)
+                yield {
+                    "username": username,
+                    "place": place,
+                    "location": name,
+                    "samples": [
+                        {
+                            "timestamp": (started + timedelta(seconds=first + offset)).isoformat(),
+                            "rssi_values": self.scan(location),
+                        }
+                        for offset in range(count)
+                    ],
+                }
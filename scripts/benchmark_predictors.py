@@ -0,0 +1,123 @@
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import train_test_split
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+# Define the paths
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+OUTPUT_DIR = os.path.join(BASE_DIR, "output")
+
+# Make the app package importable when run as `python scripts/benchmark_predictors.py`
+sys.path.insert(0, BASE_DIR)
+from app.services.export_formats import read_export
+from app.services.predictors import ENGINES, CentroidPredictor, ForestPredictor, KNNPredictor
+from app.services.training import fit_model
+
+
+def build_predictor(engine, X, y, k):
+    if engine == "forest":
+        return ForestPredictor(fit_model(X, y))
+    if engine == "knn":
+        return KNNPredictor(X, y, k)
+    return CentroidPredictor(X, y)
+
+
+def benchmark_engine(engine, X_train, y_train, X_test, y_test, k, single_runs):
+    """
+    Fit one engine on the training split and measure accuracy on the test split,
+    batch throughput (all test scans in one call) and single-scan latency (one
+    call per scan, the WebSocket case).
+    """
+    started = time.perf_counter()
+    predictor = build_predictor(engine, X_train, y_train, k)
+    build_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    probabilities = predictor.predict_proba(X_test)
+    batch_seconds = time.perf_counter() - started
+    predictions = np.asarray(predictor.classes)[probabilities.argmax(axis=1)]
+
+    latencies = []
+    for row in X_test[:single_runs]:
+        started = time.perf_counter()
+        predictor.predict_proba(row[np.newaxis, :])
+        latencies.append(time.perf_counter() - started)
+    latencies_ms = np.asarray(latencies) * 1000
+
+    return {
+        "engine": engine,
+        "accuracy": float((predictions == y_test).mean()),
+        "build_seconds": build_seconds,
+        "batch_scans_per_second": len(X_test) / batch_seconds if batch_seconds else None,
+        "single_p50_ms": float(np.percentile(latencies_ms, 50)),
+        "single_p99_ms": float(np.percentile(latencies_ms, 99)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare prediction engines on an export (GET /output/{place_id}, any format)"
+    )
+    parser.add_argument(
+        "csv_file", nargs="?", help="Export file, defaults to the first CSV in output/"
+    )
+    parser.add_argument("--engines", default=",".join(ENGINES), help="Comma-separated engines")
+    parser.add_argument("--test-size", type=float, default=0.25)
+    parser.add_argument("--k", type=int, default=5, help="Neighbours for the knn engine")
+    parser.add_argument("--single-runs", type=int, default=200, help="Scans timed one by one")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    csv_file = args.csv_file
+    if csv_file is None:
+        csv_files = sorted(f for f in os.listdir(OUTPUT_DIR) if f.endswith(".csv"))
+        if not csv_files:
+            logger.error(f"No CSV files found in {OUTPUT_DIR}")
+            sys.exit(1)
+        csv_file = os.path.join(OUTPUT_DIR, csv_files[0])
+
+    _, X, y = read_export(csv_file)
+    # Stratify when every location has enough scans to appear in both splits
+    stratify = y if pd.Series(y).value_counts().min() >= 2 else None
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=args.test_size, random_state=args.seed, stratify=stratify
+    )
+    logger.info(
+        f"{csv_file}: {len(X_train)} training / {len(X_test)} test scans, "
+        f"{X.shape[1]} BSSIDs, {len(set(y))} locations"
+    )
+
+    results = [
+        benchmark_engine(
+            engine.strip(), X_train, y_train, X_test, y_test, args.k, args.single_runs
+        )
+        for engine in args.engines.split(",")
+    ]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'engine':<10}{'accuracy':>10}{'build s':>10}{'batch scans/s':>16}{'p50 ms':>10}{'p99 ms':>10}")
+    for result in results:
+        print(
+            f"{result['engine']:<10}{result['accuracy']:>10.3f}{result['build_seconds']:>10.3f}"
+            f"{result['batch_scans_per_second'] or 0:>16.0f}"
+            f"{result['single_p50_ms']:>10.3f}{result['single_p99_ms']:>10.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import os
+import sys
+import asyncio
+import logging
+import argparse
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+# Define the paths
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Make the app package importable when run as `python scripts/pack_rssi_values.py`
+sys.path.insert(0, BASE_DIR)
+from sqlalchemy import text
+from app.database import AsyncSessionLocal, engine
+from app.migrations import run_migrations
+from app.services.sample_partitions import bump_place_versions
+
+# Only samples of the given place, when --place-id is passed
+PLACE_FILTER = """
+    AND r.sample_id IN (
+        SELECT s.id FROM samples s JOIN locations l ON l.id = s.location_id
+        WHERE l.place_id = :place_id
+    )
+"""
+
+ADD_BSSIDS = """
+    INSERT INTO bssids (bssid)
+    SELECT DISTINCT r.bssid FROM rssi_values r
+    WHERE r.sample_id > :after AND r.sample_id <= :upto {place_filter}
+    ORDER BY 1
+    ON CONFLICT (bssid) DO NOTHING
+"""
+
+# One statement, so the rows deleted are exactly those of the samples it packed:
+# a sample committed meanwhile (possibly with BSSIDs ADD_BSSIDS did not see, so
+# it is skipped) keeps its rows until a later run
+PACK_SAMPLES = """
+    WITH packed AS (
+        UPDATE samples SET bssid_ids = p.bssid_ids, rssis = p.rssis
+        FROM (
+            SELECT r.sample_id, array_agg(b.id ORDER BY b.id) AS bssid_ids,
+                   array_agg(r.rssi::smallint ORDER BY b.id) AS rssis
+            FROM rssi_values r LEFT JOIN bssids b ON b.bssid = r.bssid
+            WHERE r.sample_id > :after AND r.sample_id <= :upto {place_filter}
+            GROUP BY r.sample_id
+            HAVING bool_and(b.id IS NOT NULL)
+        ) p
+        WHERE samples.id = p.sample_id AND samples.bssid_ids IS NULL
+        RETURNING samples.id, samples.location_id
+    ), deleted AS (
+        DELETE FROM rssi_values WHERE sample_id IN (SELECT id FROM packed)
+    )
+    SELECT count(*), coalesce(array_agg(DISTINCT l.place_id), '{{}}')
+    FROM packed JOIN locations l ON l.id = packed.location_id
+"""
+
+
+async def pack(batch_size: int, place_id) -> None:
+    """
+    Move readings from rssi_values rows into the packed layout (see
+    RSSI_STORAGE), one sample ID range per transaction so the API keeps serving.
+    """
+    async with engine.begin() as conn:
+        await run_migrations(conn)
+
+    place_filter = PLACE_FILTER if place_id is not None else ""
+    async with AsyncSessionLocal() as session:
+        bounds = (
+            await session.execute(text("SELECT min(sample_id), max(sample_id) FROM rssi_values"))
+        ).one()
+    if bounds[0] is None:
+        logger.info("No rssi_values rows to pack")
+        return
+
+    after, last = bounds[0] - 1, bounds[1]
+    packed = 0
+    while after < last:
+        upto = min(after + batch_size, last)
+        params = {"after": after, "upto": upto, "place_id": place_id}
+        async with AsyncSessionLocal() as session, session.begin():
+            await session.execute(text(ADD_BSSIDS.format(place_filter=place_filter)), params)
+            result = await session.execute(text(PACK_SAMPLES.format(place_filter=place_filter)), params)
+            count, place_ids = result.one()
+            # Last, so the places are only locked until the commit: cached exports
+            # of the places are rebuilt
+            await bump_place_versions(await session.connection(), place_ids)
+            packed += count
+        logger.info(f"Packed samples up to ID {upto} ({packed} so far)")
+        after = upto
+
+    logger.info(
+        f"Packed {packed} samples. Run VACUUM FULL rssi_values (or pg_repack) to return the space"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert stored rssi_values rows into the packed per-sample layout"
+    )
+    parser.add_argument("--batch-size", type=int, default=5000, help="Sample IDs per transaction")
+    parser.add_argument("--place-id", type=int, help="Only pack the samples of this place")
+    args = parser.parse_args()
+    asyncio.run(pack(args.batch_size, args.place_id))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+import os
+import sys
+import asyncio
+import logging
+import argparse
+from datetime import datetime, timezone
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+# Define the paths
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Make the app package importable when run as `python scripts/partition_samples.py`
+sys.path.insert(0, BASE_DIR)
+from sqlalchemy import text
+from app.config import settings
+from app.database import engine
+from app.migrations import run_migrations
+from app.services.sample_partitions import (
+    add_months,
+    create_before_partition,
+    create_partition,
+    is_partitioned,
+    missing_partitions,
+    partition_start,
+    sample_maintenance,
+)
+
+
+async def convert(months: int, ahead: int) -> None:
+    """
+    Rebuild samples as a table partitioned by range on timestamp, with one
+    partition per `months` months of existing data, `ahead` more after the
+    current one and one catching anything older. Runs in one transaction holding
+    an exclusive lock on samples, so stop ingestion first on large tables.
+
+    There is no DEFAULT partition, as it would rule out detaching expired
+    partitions concurrently: samples timestamped after the partitions created
+    ahead are rejected (raise SAMPLE_PARTITIONS_AHEAD if clients send those), and
+    samples without a timestamp are set to the Unix epoch, which makes them the
+    first to expire under SAMPLE_RETENTION_DAYS.
+
+    Unique constraints on a partitioned table must include timestamp, so the new
+    table has no primary key (IDs still come from the same sequence and are
+    indexed by ix_samples_id) and unique indexes are not recreated. For the same
+    reason the foreign key from rssi_values to samples is dropped; deletes remove
+    readings themselves.
+    """
+    async with engine.begin() as conn:
+        await run_migrations(conn)
+        if await is_partitioned(conn):
+            logger.info("samples is already partitioned")
+            return
+
+        await conn.execute(text("LOCK TABLE samples IN ACCESS EXCLUSIVE MODE"))
+        sequence = (
+            await conn.execute(text("SELECT pg_get_serial_sequence('samples', 'id')"))
+        ).scalar()
+        index_definitions = (
+            await conn.execute(
+                text(
+                    """
+                    SELECT pg_get_indexdef(i.indexrelid)
+                    FROM pg_index i
+                    WHERE i.indrelid = 'samples'::regclass AND NOT i.indisunique
+                    """
+                )
+            )
+        ).scalars().all()
+        first, last = (
+            await conn.execute(text('SELECT min("timestamp"), max("timestamp") FROM samples'))
+        ).one()
+
+        result = await conn.execute(
+            text(
+                """UPDATE samples SET "timestamp" = '1970-01-01 00:00:00+00' WHERE "timestamp" IS NULL"""
+            )
+        )
+        if result.rowcount:
+            logger.info(f"Set the timestamp of {result.rowcount} samples without one to the Unix epoch")
+
+        await conn.execute(text("ALTER TABLE samples RENAME TO samples_unpartitioned"))
+        if sequence:
+            # Keep the ID sequence alive when the old table is dropped
+            await conn.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY NONE"))
+        await conn.execute(
+            text(
+                "CREATE TABLE samples (LIKE samples_unpartitioned INCLUDING DEFAULTS) "
+                'PARTITION BY RANGE ("timestamp")'
+            )
+        )
+
+        now = datetime.now(timezone.utc)
+        last_ahead = add_months(partition_start(now, months), months * ahead)
+        ranges = missing_partitions([], first or now, max(last or now, last_ahead), months)
+        await create_before_partition(conn, ranges[0][0])
+        for start, end in ranges:
+            await create_partition(conn, start, end)
+        logger.info(f"Created {len(ranges)} partitions from {ranges[0][0]:%Y-%m} to {ranges[-1][0]:%Y-%m}")
+
+        result = await conn.execute(text("INSERT INTO samples SELECT * FROM samples_unpartitioned"))
+        logger.info(f"Copied {result.rowcount} samples")
+
+        foreign_keys = (
+            await conn.execute(
+                text(
+                    """
+                    SELECT conname FROM pg_constraint
+                    WHERE contype = 'f' AND confrelid = 'samples_unpartitioned'::regclass
+                      AND conrelid = 'rssi_values'::regclass
+                    """
+                )
+            )
+        ).scalars().all()
+        for name in foreign_keys:
+            await conn.execute(text(f"ALTER TABLE rssi_values DROP CONSTRAINT {name}"))
+        await conn.execute(text("DROP TABLE samples_unpartitioned"))
+
+        await conn.execute(
+            text("ALTER TABLE samples ADD FOREIGN KEY (location_id) REFERENCES locations (id)")
+        )
+        for definition in index_definitions:
+            # Read before the rename, so they already name the new table
+            await conn.execute(text(definition))
+        if sequence:
+            await conn.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY samples.id"))
+    logger.info("samples is now partitioned by timestamp")
+
+
+async def main_async(args) -> None:
+    sample_maintenance.partition_months = args.months
+    sample_maintenance.partitions_ahead = args.ahead
+    if not args.maintain:
+        await convert(args.months, args.ahead)
+    summary = await sample_maintenance.run_once()
+    if summary is None:
+        logger.info("Maintenance is running in another process")
+    else:
+        logger.info(f"Maintenance: {summary}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Partition samples by timestamp and run one retention/partition maintenance pass"
+    )
+    parser.add_argument(
+        "--months", type=int, default=settings.SAMPLE_PARTITION_MONTHS, help="Months per partition"
+    )
+    parser.add_argument(
+        "--ahead",
+        type=int,
+        default=settings.SAMPLE_PARTITIONS_AHEAD,
+        help="Partitions to create after the current one",
+    )
+    parser.add_argument(
+        "--maintain",
+        action="store_true",
+        help="Skip the conversion and only run maintenance (SAMPLE_RETENTION_DAYS etc.), e.g. from cron",
+    )
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
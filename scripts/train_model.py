@@ -1,9 +1,8 @@
 import os
 import sys
+import asyncio
 import logging
 import argparse
-import pandas as pd
-from whereami.learn import learn
 
 # Set up logging
 logging.basicConfig(
@@ -13,13 +12,22 @@ logger = logging.getLogger(__name__)
 
 # Define the paths
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-OUTPUT_DIR = os.path.join(BASE_DIR, "output")
-TRAINED_DIR = os.path.join(BASE_DIR, "trained")
 
+# Make the app package importable when run as `python scripts/train_model.py`
+sys.path.insert(0, BASE_DIR)
+from app.config import settings
+from app.database import AsyncSessionLocal, engine
+from app.models.user import User  # noqa: F401 (mapped before Place.user is resolved)
+from app.repositories.sample import SampleRepository
+from app.services.executor import shutdown_executors
+from app.services.model_registry import ModelRegistry
+from app.services.training import load_training_data, train_and_publish
 
-def train_place_model(place_id):
+
+async def train_place_model(place_id):
     """
-    Train a whereami model using the exported CSV data for a specific place.
+    Train a whereami model for a specific place from its samples in the database,
+    the same way the API's training jobs do.
 
     Args:
         place_id (int): The ID of the place to train a model for
@@ -28,30 +36,26 @@ def train_place_model(place_id):
         bool: True if training was successful, False otherwise
     """
     try:
-        # Ensure trained directory exists
-        place_model_dir = os.path.join(TRAINED_DIR, str(place_id))
-        os.makedirs(place_model_dir, exist_ok=True)
-
-        # Find the CSV file for this place_id
-        place_csv_files = [f for f in os.listdir(OUTPUT_DIR) if f.endswith(".csv")]
-
-        if not place_csv_files:
-            logger.error(f"No CSV files found in {OUTPUT_DIR}")
+        async with AsyncSessionLocal() as session:
+            version = await SampleRepository(session).get_place_version(place_id)
+        if version == 0:
+            logger.error(f"No samples found for place with ID {place_id}")
             return False
 
-        # For now, take the first CSV file found (in a real system, you'd match the place_id)
-        csv_file = os.path.join(OUTPUT_DIR, place_csv_files[0])
+        bssids, X, y = await load_training_data(place_id, version, settings.EXPORT_CHUNK_ROWS)
 
-        # Use whereami's training function
-        # This will read the CSV, train the model, and save it to the specified path
-        learn(csv_file=csv_file, model_path=place_model_dir)
+        # Same classifier and publishing steps as the API's training jobs
+        train_and_publish(ModelRegistry.model_dir(place_id), bssids, X, y)
 
-        logger.info(f"Successfully trained model for place ID {place_id}")
+        logger.info(f"Successfully trained model for place ID {place_id} on {len(y)} samples")
         return True
 
     except Exception as e:
         logger.error(f"Error training model: {str(e)}")
         return False
+    finally:
+        await engine.dispose()
+        shutdown_executors()
 
 
 if __name__ == "__main__":
@@ -64,11 +68,8 @@ if __name__ == "__main__":
 
     args = parser.parse_args()
 
-    # Ensure necessary directories exist
-    os.makedirs(TRAINED_DIR, exist_ok=True)
-
     # Train the model
-    success = train_place_model(args.place_id)
+    success = asyncio.run(train_place_model(args.place_id))
 
     if success:
         logger.info(f"Model training completed for place ID {args.place_id}")